@@ -4,12 +4,14 @@ from django.templatetags.static import static
 from django.utils.html import format_html
 from django.utils.http import url_has_allowed_host_and_scheme
 
+from .models import DeliveryZone
 from .models import Product
 from .models import ProductCategory
 from .models import Restaurant
 from .models import RestaurantMenuItem
 from .models import Order
 from .models import OrderMenuItem
+from .order_registration import schedule_geocoding
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
@@ -17,6 +19,11 @@ class RestaurantMenuItemInline(admin.TabularInline):
     extra = 0
 
 
+class DeliveryZoneInline(admin.TabularInline):
+    model = DeliveryZone
+    extra = 0
+
+
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
     search_fields = [
@@ -30,7 +37,8 @@ class RestaurantAdmin(admin.ModelAdmin):
         'contact_phone',
     ]
     inlines = [
-        RestaurantMenuItemInline
+        DeliveryZoneInline,
+        RestaurantMenuItemInline,
     ]
 
 
@@ -118,6 +126,7 @@ class OrderMenuItemInline(admin.TabularInline):
 class OrderAdmin(admin.ModelAdmin):
     search_fiels = ['name', 'last_name', 'address']
     list_filter = ['status']
+    readonly_fields = ['total']
     inlines = [OrderMenuItemInline]
 
     def response_change(self, request, obj):
@@ -132,7 +141,15 @@ class OrderAdmin(admin.ModelAdmin):
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
 
+        for instance in formset.deleted_objects:
+            instance.delete()
         for instance in instances:
             instance.price = instance.product.price
             instance.save()
         formset.save_m2m()
+
+        form.instance.update_total()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        schedule_geocoding([form.instance])
@@ -0,0 +1,328 @@
+from collections import defaultdict
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from locations.distances import distance_cache
+from locations.geo_tools import get_or_create_locations
+from locations.spatial import GridIndex, PolygonZone, RadiusZone, ZoneIndex
+
+
+INDEX_VERSION_CACHE_KEY = 'foodcartapp:availability-index-version'
+GRID_VERSION_CACHE_KEY = 'foodcartapp:restaurant-grid-version'
+
+cached_index = None
+cached_index_lock = threading.Lock()
+cached_grid = None
+cached_grid_lock = threading.Lock()
+PENDING_GRID_REBUILD_INTERVAL = 5
+
+
+class CandidateRestaurant:
+    __slots__ = ('restaurant', 'distance')
+
+    def __init__(self, restaurant, distance=None):
+        self.restaurant = restaurant
+        self.distance = distance
+
+    def __str__(self):
+        return str(self.restaurant)
+
+
+class AvailabilityIndex:
+    def __init__(self, menu_items):
+        self.version = None
+        self.restaurants = []
+        self.restaurant_bits = {}
+        self.product_masks = defaultdict(int)
+
+        for menu_item in menu_items:
+            bit = self.restaurant_bits.get(menu_item.restaurant_id)
+            if bit is None:
+                bit = len(self.restaurants)
+                self.restaurant_bits[menu_item.restaurant_id] = bit
+                self.restaurants.append(menu_item.restaurant)
+
+            self.product_masks[menu_item.product_id] |= 1 << bit
+
+    @property
+    def product_ids(self):
+        return list(self.product_masks)
+
+    def get_mask(self, product_ids):
+        mask = 0
+        for number, product_id in enumerate(product_ids):
+            product_mask = self.product_masks.get(product_id, 0)
+            mask = product_mask if number == 0 else mask & product_mask
+            if not mask:
+                break
+        return mask
+
+    def get_restaurant_ids(self, product_ids):
+        return {
+            restaurant.pk
+            for restaurant in self.get_restaurants(self.get_mask(product_ids))
+        }
+
+    def get_restaurants(self, mask):
+        restaurants = []
+        while mask:
+            lowest_bit = mask & -mask
+            restaurants.append(self.restaurants[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+        return restaurants
+
+
+class RestaurantGrid:
+    def __init__(self, restaurants, locations):
+        self.version = None
+        self.built_at = time.monotonic()
+        self.restaurants = {restaurant.pk: restaurant for restaurant in restaurants}
+        self.locations = locations
+        self.pending_addresses = [
+            restaurant.address for restaurant in restaurants
+            if restaurant.address not in locations
+        ]
+        self.points = {
+            restaurant.pk: locations[restaurant.address]
+            for restaurant in restaurants
+            if locations.get(restaurant.address)
+        }
+
+        # Restaurants without zones deliver anywhere within the search
+        # radius. Zones are laid out on the same grid, so a point only
+        # has to be tested against the zones of its own cell.
+        self.zones = ZoneIndex(cell_size_km=settings.RESTAURANT_GRID_CELL_KM)
+        self.unlocated_ids = []
+        self.zoned_ids = set()
+        unzoned_points = {}
+        for restaurant in restaurants:
+            point = self.points.get(restaurant.pk)
+            zones = restaurant.delivery_zones.all()
+            if not zones:
+                if point:
+                    unzoned_points[restaurant.pk] = point
+                else:
+                    self.unlocated_ids.append(restaurant.pk)
+                continue
+
+            self.zoned_ids.add(restaurant.pk)
+            for zone in zones:
+                if zone.polygon is not None:
+                    self.zones.add(restaurant.pk, PolygonZone(zone.polygon))
+                elif point:
+                    self.zones.add(restaurant.pk, RadiusZone(point, zone.radius_km))
+                elif restaurant.pk not in self.unlocated_ids:
+                    self.unlocated_ids.append(restaurant.pk)
+
+        self.grid = GridIndex(
+            unzoned_points,
+            cell_size_km=settings.RESTAURANT_GRID_CELL_KM
+        )
+
+    def delivers_to(self, point, restaurant_ids):
+        # Only delivery zones rule a restaurant out here: restaurants
+        # without zones, or whose zones can't be placed yet, may deliver
+        # anywhere.
+        zoned_ids = self.zones.find(point)
+        return any(
+            restaurant_id not in self.zoned_ids
+            or restaurant_id in zoned_ids
+            or restaurant_id in self.unlocated_ids
+            for restaurant_id in restaurant_ids
+        )
+
+    def find_nearest(self, points, radius_km=None, restaurant_ids=None):
+        if restaurant_ids is None:
+            restaurant_ids = [None] * len(points)
+
+        nearby = []
+        pairs = []
+        for point, allowed_ids in zip(points, restaurant_ids):
+            if point is None:
+                nearby.append(None)
+                continue
+
+            zoned_ids = self.zones.find(point)
+            located_ids = [
+                restaurant_id
+                for restaurant_id in [
+                    *self.grid.get_candidate_ids(point, radius_km),
+                    *(
+                        restaurant_id for restaurant_id in zoned_ids
+                        if restaurant_id in self.points
+                    ),
+                ]
+                if allowed_ids is None or restaurant_id in allowed_ids
+            ]
+            # Restaurants without coordinates can't be ruled out by
+            # distance, so they are listed after the nearby ones.
+            unlocated_ids = [
+                restaurant_id
+                for restaurant_id in [
+                    *self.unlocated_ids,
+                    *(
+                        restaurant_id for restaurant_id in zoned_ids
+                        if restaurant_id not in self.points
+                        and restaurant_id not in self.unlocated_ids
+                    ),
+                ]
+                if allowed_ids is None or restaurant_id in allowed_ids
+            ]
+            nearby.append((zoned_ids, located_ids, unlocated_ids))
+            pairs.extend(
+                (point, self.points[restaurant_id]) for restaurant_id in located_ids
+            )
+
+        # Distances of all the points are calculated as one matrix.
+        distances = iter(distance_cache.get_pair_distances(pairs))
+        nearest = []
+        for allowed_ids, point_nearby in zip(restaurant_ids, nearby):
+            if point_nearby is None:
+                nearest.append([
+                    (restaurant_id, None) for restaurant_id in self.restaurants
+                    if allowed_ids is None or restaurant_id in allowed_ids
+                ])
+                continue
+
+            zoned_ids, located_ids, unlocated_ids = point_nearby
+            located_distances = sorted(
+                (
+                    (restaurant_id, distance)
+                    for restaurant_id, distance in zip(located_ids, distances)
+                    if restaurant_id in zoned_ids
+                    or radius_km is None
+                    or distance <= radius_km
+                ),
+                key=lambda pair: pair[1]
+            )
+            nearest.append(located_distances + [
+                (restaurant_id, None) for restaurant_id in unlocated_ids
+            ])
+        return nearest
+
+    def find_candidates(self, points, restaurant_ids):
+        candidates = []
+        for nearest in self.find_nearest(
+            points,
+            radius_km=settings.RESTAURANT_SEARCH_RADIUS_KM,
+            restaurant_ids=restaurant_ids
+        ):
+            point_candidates = []
+            nearby_count = 0
+            for restaurant_id, distance in nearest:
+                if distance is not None:
+                    if nearby_count == settings.RESTAURANT_SEARCH_LIMIT:
+                        continue
+                    nearby_count += 1
+                point_candidates.append(
+                    CandidateRestaurant(self.restaurants[restaurant_id], distance)
+                )
+            candidates.append(point_candidates)
+        return candidates
+
+    def is_fresh(self, version):
+        if self.version != version:
+            return False
+        return (
+            not self.pending_addresses
+            or time.monotonic() - self.built_at < PENDING_GRID_REBUILD_INTERVAL
+        )
+
+
+def get_version(cache_key):
+    # Tokens expire, so a process that misses an invalidation, e.g. with
+    # a per-process cache, rebuilds its indexes within the timeout anyway.
+    version = cache.get(cache_key)
+    if version is None:
+        cache.add(
+            cache_key,
+            uuid.uuid4().hex,
+            timeout=settings.CACHE_VERSION_TIMEOUT
+        )
+        version = cache.get(cache_key)
+    return version
+
+
+def get_index_version():
+    return get_version(INDEX_VERSION_CACHE_KEY)
+
+
+def invalidate_availability_index():
+    cache.set(
+        INDEX_VERSION_CACHE_KEY,
+        uuid.uuid4().hex,
+        timeout=settings.CACHE_VERSION_TIMEOUT
+    )
+
+
+def invalidate_restaurant_grid():
+    cache.set(
+        GRID_VERSION_CACHE_KEY,
+        uuid.uuid4().hex,
+        timeout=settings.CACHE_VERSION_TIMEOUT
+    )
+
+
+def get_availability_index():
+    global cached_index
+
+    from .models import RestaurantMenuItem
+
+    version = get_index_version()
+    index = cached_index
+    if index is not None and index.version == version:
+        return index
+
+    with cached_index_lock:
+        if cached_index is not None and cached_index.version == version:
+            return cached_index
+
+        index = AvailabilityIndex(
+            RestaurantMenuItem.objects.select_related('restaurant').filter(
+                availability=True,
+            )
+        )
+        index.version = version
+        cached_index = index
+        return index
+
+
+def get_fresh_availability_index():
+    index = cached_index
+    if index is not None and index.version == get_index_version():
+        return index
+    return None
+
+
+def get_restaurant_grid():
+    global cached_grid
+
+    from .models import Restaurant
+
+    version = get_version(GRID_VERSION_CACHE_KEY)
+    grid = cached_grid
+    if grid is not None and grid.is_fresh(version):
+        return grid
+
+    with cached_grid_lock:
+        if cached_grid is not None and cached_grid.is_fresh(version):
+            return cached_grid
+
+        restaurants = list(
+            Restaurant.objects.prefetch_related('delivery_zones')
+        )
+        # Restaurant addresses are geocoded by the queue worker, which
+        # also refreshes the orders; until then the grid is rebuilt every
+        # few seconds.
+        locations = get_or_create_locations(
+            [restaurant.address for restaurant in restaurants],
+            geocode=False
+        )
+        grid = RestaurantGrid(restaurants, locations)
+        grid.version = version
+        cached_grid = grid
+        return grid
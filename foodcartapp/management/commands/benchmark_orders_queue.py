@@ -0,0 +1,56 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет вставку заказов и выборку страницы доски заказов. '
+        'Все созданные заказы откатываются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--active-share', type=float, default=0.1)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run_benchmark(**options)
+            transaction.set_rollback(True)
+
+    def run_benchmark(self, orders, active_share, page_size, repeat, **options):
+        statuses = [Order.CREATED, Order.ASSEMBLING, Order.DELIVERING]
+
+        started_at = perf_counter()
+        for number in range(orders):
+            is_active = random.random() < active_share
+            Order.objects.create(
+                name=f'Имя {number}',
+                last_name=f'Фамилия {number}',
+                address=f'Москва, ул. Тестовая, д. {number}',
+                phonenumber=f'+7916{number % 10000000:07d}',
+                status=random.choice(statuses) if is_active else Order.DONE,
+                payment_method=random.choice([Order.ONLINE, Order.CASH]),
+            )
+        insert_time = perf_counter() - started_at
+
+        queue = Order.objects.exclude(status=Order.DONE).with_relevance()
+
+        started_at = perf_counter()
+        for _ in range(repeat):
+            list(queue[:page_size])
+        page_time = (perf_counter() - started_at) / repeat
+
+        self.stdout.write(
+            f'Вставка: {insert_time * 1000 / orders:.3f} мс на заказ'
+        )
+        self.stdout.write(
+            f'Первая страница доски: {page_time * 1000:.3f} мс'
+        )
+        self.stdout.write(queue[:page_size].explain())
@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from foodcartapp.models import OrderIntake
+from foodcartapp.order_registration import save_orders, validate_orders
+
+
+class Command(BaseCommand):
+    help = 'Оформляет заказы, принятые через очередь'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--interval', type=float, default=1)
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать накопившиеся заказы и завершиться'
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Показать длину очереди и задержку обработки'
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+
+        while True:
+            processed = self.process_batch(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Обработано заказов: {processed}')
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['interval'])
+
+    def process_batch(self, batch_size):
+        with transaction.atomic():
+            intakes = list(
+                OrderIntake.objects.select_for_update(skip_locked=True)
+                .filter(status=OrderIntake.PENDING)
+                .order_by('created_at', 'id')[:batch_size]
+            )
+            if not intakes:
+                return 0
+
+            validation_results = validate_orders(
+                [intake.payload for intake in intakes]
+            )
+            valid_intakes = []
+            valid_records = []
+            for intake, (validated_data, errors) in zip(
+                intakes,
+                validation_results
+            ):
+                if errors:
+                    intake.status = OrderIntake.FAILED
+                    intake.error = errors
+                else:
+                    valid_intakes.append(intake)
+                    valid_records.append(validated_data)
+
+            orders = save_orders(valid_records)
+            for intake, order in zip(valid_intakes, orders):
+                intake.status = OrderIntake.PROCESSED
+                intake.order = order
+
+            processed_at = timezone.now()
+            for intake in intakes:
+                intake.processed_at = processed_at
+            OrderIntake.objects.bulk_update(
+                intakes,
+                ['status', 'order', 'error', 'processed_at']
+            )
+        return len(intakes)
+
+    def print_stats(self):
+        pending = OrderIntake.objects.filter(status=OrderIntake.PENDING)
+        oldest = pending.order_by('created_at', 'id').values_list(
+            'created_at',
+            flat=True
+        ).first()
+        lag = (timezone.now() - oldest).total_seconds() if oldest else 0
+        self.stdout.write(f'В очереди: {pending.count()}')
+        self.stdout.write(f'Задержка: {lag:.1f} с')
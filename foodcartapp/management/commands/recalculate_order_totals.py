@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохранённую стоимость заказов по их позициям'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='только показать заказы с неверной стоимостью',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        mismatched_orders = list(
+            Order.objects.with_calculated_totals().exclude(
+                total=F('calculated_total')
+            ).only('pk', 'total')
+        )
+
+        for order in mismatched_orders:
+            self.stdout.write(
+                f'Заказ {order.pk}: {order.total} вместо {order.calculated_total}'
+            )
+            order.total = order.calculated_total
+
+        if not options['check']:
+            Order.objects.bulk_update(
+                mismatched_orders,
+                ['total'],
+                batch_size=options['batch_size']
+            )
+
+        self.stdout.write(f'Заказов с неверной стоимостью: {len(mismatched_orders)}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рестораны, которые могут приготовить открытые заказы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        order_ids = list(
+            Order.objects.exclude(status=Order.DONE).values_list('pk', flat=True)
+        )
+        batch_size = options['batch_size']
+        for start in range(0, len(order_ids), batch_size):
+            Order.objects.filter(
+                pk__in=order_ids[start:start + batch_size]
+            ).refresh_candidate_restaurants()
+
+        self.stdout.write(f'Обновлено заказов: {len(order_ids)}')
@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 02:21
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def set_order_total(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderMenuItem = apps.get_model('foodcartapp', 'OrderMenuItem')
+
+    items_total = OrderMenuItem.objects.filter(
+        order=OuterRef('pk')
+    ).values('order').annotate(
+        total=Sum(F('quantity') * F('price'))
+    ).values('total')
+
+    Order.objects.update(
+        total=Coalesce(
+            Subquery(items_total),
+            Value(0),
+            output_field=models.DecimalField()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0050_ordercandidaterestaurant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)], verbose_name='стоимость заказа'),
+        ),
+        migrations.RunPython(set_order_total, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 3.2 on 2026-10-18 02:23
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.expressions
+import django.utils.timezone
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0051_order_total'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='address',
+            field=models.CharField(max_length=200, verbose_name='Адрес'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='called_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Уточнен в'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='created_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True, verbose_name='Зарегистрирован в'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='delivered_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Доставлен в'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='last_name',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Фамилия'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='name',
+            field=models.CharField(blank=True, max_length=50, verbose_name='Имя'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='payment_method',
+            field=models.CharField(blank=True, choices=[('online', 'Онлайн-оплата'), ('cash', 'Оплата при получении')], max_length=50, verbose_name='Способ оплаты'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='phonenumber',
+            field=phonenumber_field.modelfields.PhoneNumberField(max_length=128, region='RU', validators=[django.core.validators.RegexValidator(regex='^(\\+7|7|8)?[\\s\\-]?\\(?[489][0-9]{2}\\)?[\\s\\-]?[0-9]{3}[\\s\\-]?[0-9]{2}[\\s\\-]?[0-9]{2}$')], verbose_name='Телефон'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('created', 'Необработанный'), ('assembling', 'Сборка'), ('delivering', 'Доставка'), ('done', 'Доставлен')], default='created', max_length=50, verbose_name='Статус'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.expressions.OrderBy(django.db.models.expressions.Case(django.db.models.expressions.When(status='created', then=django.db.models.expressions.Value(1)), default=django.db.models.expressions.Value(0), output_field=models.IntegerField()), descending=True), django.db.models.expressions.F('created_at'), django.db.models.expressions.F('id'), condition=models.Q(_negated=True, status='done'), name='order_active_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(_negated=True, status='done'), fields=['address'], name='order_active_address_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2 on 2026-10-18 02:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0053_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderIntake',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='токен')),
+                ('payload', models.JSONField(verbose_name='данные заказа')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('processed', 'Обработан'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='статус')),
+                ('error', models.JSONField(blank=True, null=True, verbose_name='ошибки')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='поступил')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='обработан')),
+                ('order', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='intake', to='foodcartapp.order', verbose_name='заказ')),
+            ],
+            options={
+                'verbose_name': 'заказ в очереди',
+                'verbose_name_plural': 'заказы в очереди',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='orderintake',
+            index=models.Index(condition=models.Q(status='pending'), fields=['created_at', 'id'], name='orderintake_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 02:45
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0054_orderintake'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryZone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('radius_km', models.FloatField(blank=True, help_text='Считается от адреса ресторана', null=True, validators=[django.core.validators.MinValueValidator(0)], verbose_name='радиус, км')),
+                ('polygon', models.JSONField(blank=True, help_text='Вершины в виде [[широта, долгота], ...]', null=True, verbose_name='многоугольник')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_zones', to='foodcartapp.restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'зона доставки',
+                'verbose_name_plural': 'зоны доставки',
+            },
+        ),
+    ]
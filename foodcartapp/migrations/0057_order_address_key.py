@@ -0,0 +1,74 @@
+# Generated by Django 3.2 on 2026-10-18 03:07
+
+import re
+
+from django.db import migrations, models
+
+
+# A copy of locations.addresses.normalize_address as of this migration,
+# so that later changes to the normalizer don't change what it does.
+ADDRESS_ABBREVIATIONS = {
+    'улица': 'ул',
+    'проспект': 'пр-т',
+    'просп': 'пр-т',
+    'пр-кт': 'пр-т',
+    'переулок': 'пер',
+    'площадь': 'пл',
+    'шоссе': 'ш',
+    'бульвар': 'б-р',
+    'бул': 'б-р',
+    'набережная': 'наб',
+    'проезд': 'пр-д',
+    'корпус': 'к',
+    'корп': 'к',
+    'строение': 'стр',
+    'квартира': 'кв',
+    'область': 'обл',
+    'район': 'р-н',
+}
+ADDRESS_FILLER_WORDS = {'г', 'город', 'д', 'дом', 'россия', 'рф'}
+ADDRESS_KEY_MAX_LENGTH = 255
+
+
+def normalize_address(address):
+    address = address.lower().replace('ё', 'е')
+    address = re.sub(r'(?<=\d)(?=[^\W\d_])|(?<=[^\W\d_])(?=\d)', ' ', address)
+    tokens = []
+    for token in re.findall(r'\w+(?:-\w+)*', address):
+        token = ADDRESS_ABBREVIATIONS.get(token, token)
+        if token not in ADDRESS_FILLER_WORDS:
+            tokens.append(token)
+    return ' '.join(tokens)[:ADDRESS_KEY_MAX_LENGTH]
+
+
+def set_order_address_keys(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+
+    orders = list(Order.objects.only('id', 'address'))
+    for order in orders:
+        order.address_key = normalize_address(order.address)
+    Order.objects.bulk_update(orders, ['address_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0056_idempotencykey_created_at_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_active_address_idx',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='address_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Нормализованный адрес'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(_negated=True, status='done'), fields=['address_key'], name='order_active_address_key_idx'),
+        ),
+        migrations.RunPython(set_order_address_keys, migrations.RunPython.noop),
+    ]
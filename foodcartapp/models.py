@@ -1,13 +1,40 @@
 from collections import defaultdict
-import copy
-
-from django.db import models
-from django.db.models import Sum, F, Prefetch
+from datetime import timedelta
+import uuid
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import (
+    Case,
+    Count,
+    F,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models import prefetch_related_objects
+from django.db.models.functions import Coalesce
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, RegexValidator
 from phonenumber_field.modelfields import PhoneNumberField
 from django.utils import timezone
 
-from locations.geo_tools import get_or_create_locations, calc_distance
+from locations.addresses import ADDRESS_KEY_MAX_LENGTH, normalize_address
+from locations.distances import load_distances, save_distances
+from locations.geo_tools import get_locations, get_or_create_locations
+from locations.models import Location
+from locations.signals import locations_geocoded
+from .availability import (
+    get_availability_index,
+    get_fresh_availability_index,
+    get_restaurant_grid,
+    invalidate_restaurant_grid,
+)
 
 
 class Restaurant(models.Model):
@@ -34,14 +61,59 @@ class Restaurant(models.Model):
         return self.name
 
 
+class DeliveryZone(models.Model):
+    restaurant = models.ForeignKey(
+        Restaurant,
+        related_name='delivery_zones',
+        verbose_name='ресторан',
+        on_delete=models.CASCADE,
+    )
+    radius_km = models.FloatField(
+        'радиус, км',
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(0)],
+        help_text='Считается от адреса ресторана'
+    )
+    polygon = models.JSONField(
+        'многоугольник',
+        null=True,
+        blank=True,
+        help_text='Вершины в виде [[широта, долгота], ...]'
+    )
+
+    class Meta:
+        verbose_name = 'зона доставки'
+        verbose_name_plural = 'зоны доставки'
+
+    def __str__(self):
+        if self.radius_km is not None:
+            return f'{self.restaurant} - {self.radius_km} км'
+        return f'{self.restaurant} - многоугольник'
+
+    def clean(self):
+        if (self.radius_km is None) == (self.polygon is None):
+            raise ValidationError('Укажите либо радиус, либо многоугольник')
+        if self.polygon is None:
+            return
+
+        try:
+            is_valid_polygon = len(self.polygon) >= 3 and all(
+                len(vertex) == 2
+                and all(isinstance(coordinate, (int, float)) for coordinate in vertex)
+                for vertex in self.polygon
+            )
+        except TypeError:
+            is_valid_polygon = False
+        if not is_valid_polygon:
+            raise ValidationError({
+                'polygon': 'Нужно не меньше трёх вершин вида [широта, долгота]'
+            })
+
+
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
-            RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
-        )
-        return self.filter(pk__in=products)
+        return self.filter(pk__in=get_availability_index().product_ids)
 
 
 class ProductCategory(models.Model):
@@ -102,6 +174,8 @@ class Product(models.Model):
 
 
 class RestaurantMenuItem(models.Model):
+    saved_values = None
+
     restaurant = models.ForeignKey(
         Restaurant,
         related_name='menu_items',
@@ -130,74 +204,245 @@ class RestaurantMenuItem(models.Model):
     def __str__(self):
         return f"{self.restaurant.name} - {self.product.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        menu_item = super().from_db(db, field_names, values)
+        menu_item.saved_values = menu_item.get_tracked_values()
+        return menu_item
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.saved_values = self.get_tracked_values()
+
+    def get_tracked_values(self):
+        # Deferred fields are not loaded just to be compared.
+        return {
+            field: self.__dict__.get(field)
+            for field in ['restaurant_id', 'product_id', 'availability']
+        }
+
+
+def is_location_pending(location):
+    return location is None or location.status == Location.PENDING
+
 
 class OrderQuerySet(models.QuerySet):
-    def get_orders_summary(self):
+    def with_calculated_totals(self):
+        items_total = OrderMenuItem.objects.filter(
+            order=OuterRef('pk')
+        ).values('order').annotate(
+            total=Sum(F('quantity') * F('price'))
+        ).values('total')
+
         return self.annotate(
-            summary=Sum(
-                F('items__quantity') * F('items__price')
+            calculated_total=Coalesce(
+                Subquery(items_total),
+                Value(0),
+                output_field=models.DecimalField()
             )
         )
 
-    def with_available_restaurants(self):
-        orders = self.prefetch_related(
-            Prefetch(
-                'items',
-                queryset=OrderMenuItem.objects.select_related('product')
+    def get_candidate_restaurant_pairs(self):
+        order_items_count = OrderMenuItem.objects.filter(
+            order=OuterRef('order')
+        ).values('order').annotate(count=Count('pk')).values('count')
+
+        return OrderMenuItem.objects.filter(
+            order__in=self.values('pk'),
+            product__menu_items__availability=True,
+        ).values(
+            'order',
+            'product__menu_items__restaurant'
+        ).annotate(
+            matched_items_count=Count('pk'),
+            items_count=Subquery(order_items_count)
+        ).filter(
+            matched_items_count=F('items_count')
+        ).values_list('order', 'product__menu_items__restaurant')
+
+    def get_available_restaurant_ids(self, orders):
+        restaurant_ids_by_order = defaultdict(set)
+        availability_index = get_fresh_availability_index()
+        if availability_index is None:
+            # Right after a menu change rebuilding the index would scan
+            # the whole menu, while the database only has to match the
+            # items of these orders.
+            for order_id, restaurant_id in Order.objects.filter(
+                pk__in=[order.pk for order in orders]
+            ).get_candidate_restaurant_pairs():
+                restaurant_ids_by_order[order_id].add(restaurant_id)
+            return restaurant_ids_by_order
+
+        product_ids_by_order = defaultdict(list)
+        for order_id, product_id in OrderMenuItem.objects.filter(
+            order__in=[order.pk for order in orders]
+        ).values_list('order', 'product'):
+            product_ids_by_order[order_id].append(product_id)
+        for order_id, product_ids in product_ids_by_order.items():
+            restaurant_ids_by_order[order_id] = (
+                availability_index.get_restaurant_ids(product_ids)
             )
+        return restaurant_ids_by_order
+
+    def with_available_restaurants(self, geocoding_timeout=None, geocode=True):
+        orders = list(self)
+        restaurant_grid = get_restaurant_grid()
+        restaurant_ids_by_order = self.get_available_restaurant_ids(orders)
+
+        restaurant_addresses = restaurant_grid.pending_addresses if geocode else []
+        locations = get_or_create_locations(
+            [*(order.address for order in orders), *restaurant_addresses],
+            timeout=geocoding_timeout,
+            geocode=geocode
+        )
+        located_addresses = [
+            address for address in restaurant_addresses if address in locations
+        ]
+        if located_addresses:
+            # Without the queue worker restaurants are geocoded here, so
+            # the other orders are notified the way the worker does it.
+            invalidate_restaurant_grid()
+            restaurant_grid = get_restaurant_grid()
+            locations_geocoded.send(sender=Location, addresses=located_addresses)
+        stored_distances = load_distances(
+            [order.address for order in orders if locations.get(order.address)],
+            [
+                restaurant_grid.restaurants[restaurant_id].address
+                for restaurant_id in restaurant_grid.points
+            ]
         )
 
-        menu_items = RestaurantMenuItem.objects.select_related(
-            'restaurant',
-            'product'
-        ).filter(
-            availability=True,
+        for order in orders:
+            order.location = locations.get(order.address)
+            order.location_pending = order.address not in locations
+
+        candidates = restaurant_grid.find_candidates(
+            [order.location for order in orders],
+            [restaurant_ids_by_order[order.pk] for order in orders]
+        )
+        for order, order_candidates in zip(orders, candidates):
+            order.restaurants = order_candidates
+
+        save_distances(
+            (
+                (
+                    order.address,
+                    order.location,
+                    candidate.restaurant.address,
+                    restaurant_grid.points[candidate.restaurant.pk],
+                    candidate.distance,
+                )
+                for order in orders
+                for candidate in order.restaurants
+                if candidate.distance is not None
+            ),
+            stored_distances
         )
 
-        order_addresses = [order.address for order in orders]
-        restaurant_addresses = [
-            menu_item.restaurant.address
-            for menu_item in menu_items
-        ]
+        return orders
 
-        locations = get_or_create_locations(
-            [*order_addresses, *restaurant_addresses]
+    def refresh_candidate_restaurants(self, geocoding_timeout=None, geocode=True):
+        orders = self.with_available_restaurants(
+            geocoding_timeout=geocoding_timeout,
+            geocode=geocode
         )
+        candidates = [
+            OrderCandidateRestaurant(
+                order=order,
+                restaurant=candidate.restaurant,
+                distance_km=candidate.distance
+            )
+            for order in orders
+            for candidate in order.restaurants
+        ]
 
-        restaurants_by_items = defaultdict(list)
+        with transaction.atomic():
+            # Concurrent refreshes of the same orders wait for each other
+            # instead of inserting the same rows twice.
+            order_ids = set(Order.objects.select_for_update().filter(
+                pk__in=[order.pk for order in orders]
+            ).order_by('pk').values_list('pk', flat=True))
+            # The indexes may still list a restaurant that another process
+            # has just deleted.
+            restaurant_ids = set(Restaurant.objects.filter(
+                pk__in={candidate.restaurant_id for candidate in candidates}
+            ).values_list('pk', flat=True))
+            OrderCandidateRestaurant.objects.filter(
+                order__in=order_ids
+            ).delete()
+            OrderCandidateRestaurant.objects.bulk_create([
+                candidate for candidate in candidates
+                if candidate.order_id in order_ids
+                and candidate.restaurant_id in restaurant_ids
+            ])
 
-        for menu_item in menu_items:
-            restaurants_by_items[menu_item.product.id].append(
-                menu_item.restaurant
+        return orders
+
+    def with_candidate_restaurants(self, geocoding_timeout=None):
+        orders = list(self)
+        addresses = {order.address for order in orders}
+        locations = get_locations(addresses)
+
+        unlocated_order_ids = [
+            order.pk for order in orders
+            if is_location_pending(locations.get(order.address_key))
+        ]
+        if unlocated_order_ids:
+            Order.objects.filter(
+                pk__in=unlocated_order_ids
+            ).refresh_candidate_restaurants(
+                geocoding_timeout=geocoding_timeout
             )
+            locations = get_locations(addresses)
+
+        prefetch_related_objects(
+            orders,
+            Prefetch(
+                'candidate_restaurants',
+                queryset=OrderCandidateRestaurant.objects.select_related(
+                    'restaurant'
+                ).order_by(F('distance_km').asc(nulls_last=True)),
+                to_attr='restaurants'
+            )
+        )
 
         for order in orders:
-            order_location = locations.get(order.address)
-            order.location = order_location
+            location = locations.get(order.address_key)
+            order.location_pending = is_location_pending(location)
+            order.location = location.coordinates if location else None
 
-            order_restaurants_by_items = [
-                copy.deepcopy(restaurants_by_items[order_item.product.id])
-                for order_item in order.items.all()
-            ]
-            order.restaurants = list(
-                set.intersection(*[
-                    set(list) for list in order_restaurants_by_items
-                ])
-            )
+        return orders
 
-            for restaurant in order.restaurants:
-                restaurant_location = locations.get(restaurant.address)
-                restaurant.distance = calc_distance(
-                    order_location,
-                    restaurant_location
-                )
+    def with_relevance(self):
+        return self.annotate(
+            relevance=ORDER_STATUS_PRIORITY
+        ).order_by(
+            '-relevance',
+            F('created_at').asc(nulls_last=True),
+            'id'
+        )
 
-            order.restaurants = sorted(
-                order.restaurants,
-                key=lambda restaurant: restaurant.distance
+    def after(self, relevance, created_at, order_id):
+        if created_at is None:
+            later_in_queue = Q(created_at__isnull=True, id__gt=order_id)
+        else:
+            later_in_queue = (
+                Q(created_at__gt=created_at)
+                | Q(created_at__isnull=True)
+                | Q(created_at=created_at, id__gt=order_id)
             )
 
-        return orders
+        return self.filter(
+            Q(relevance__lt=relevance)
+            | Q(later_in_queue, relevance=relevance)
+        )
+
+
+ORDER_STATUS_PRIORITY = Case(
+    When(status='created', then=Value(1)),
+    default=Value(0),
+    output_field=IntegerField()
+)
 
 
 class Order(models.Model):
@@ -220,20 +465,17 @@ class Order(models.Model):
     ]
 
     created_at = models.DateTimeField(
-        db_index=True,
         default=timezone.now,
         blank=True,
         null=True,
         verbose_name='Зарегистрирован в'
     )
     called_at = models.DateTimeField(
-        db_index=True,
         blank=True,
         null=True,
         verbose_name='Уточнен в'
     )
     delivered_at = models.DateTimeField(
-        db_index=True,
         blank=True,
         null=True,
         verbose_name='Доставлен в'
@@ -243,35 +485,36 @@ class Order(models.Model):
         max_length=50,
         choices=STATUS_CHOICES,
         default=CREATED,
-        db_index=True,
         verbose_name='Статус'
     )
     payment_method = models.CharField(
         max_length=50,
         choices=PAYMENT_METHOD_CHOICES,
-        db_index=True,
         blank=True,
         verbose_name='Способ оплаты'
     )
     address = models.CharField(
         max_length=200,
-        db_index=True,
         verbose_name='Адрес'
     )
+    address_key = models.CharField(
+        max_length=ADDRESS_KEY_MAX_LENGTH,
+        blank=True,
+        editable=False,
+        verbose_name='Нормализованный адрес'
+    )
     name = models.CharField(
         max_length=50,
         blank=True,
-        db_index=True,
         verbose_name='Имя'
     )
     last_name = models.CharField(
         max_length=50, blank=True,
-        db_index=True, verbose_name='Фамилия'
+        verbose_name='Фамилия'
     )
 
     phonenumber_regex = RegexValidator(regex=r'^(\+7|7|8)?[\s\-]?\(?[489][0-9]{2}\)?[\s\-]?[0-9]{3}[\s\-]?[0-9]{2}[\s\-]?[0-9]{2}$')
     phonenumber = PhoneNumberField(
-        db_index=True,
         validators=[phonenumber_regex],
         verbose_name='Телефон',
         region='RU'
@@ -280,6 +523,13 @@ class Order(models.Model):
         blank=True,
         verbose_name='Комментарий к заказу'
     )
+    total = models.DecimalField(
+        'стоимость заказа',
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        validators=[MinValueValidator(0)]
+    )
     cooking_restaurant = models.ForeignKey(
         Restaurant,
         on_delete=models.SET_NULL,
@@ -294,10 +544,37 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'заказ'
         verbose_name_plural = 'заказы'
+        indexes = [
+            models.Index(
+                ORDER_STATUS_PRIORITY.desc(),
+                'created_at',
+                'id',
+                name='order_active_queue_idx',
+                condition=~Q(status='done'),
+            ),
+            models.Index(
+                fields=['address_key'],
+                name='order_active_address_key_idx',
+                condition=~Q(status='done'),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} {self.last_name} {self.address}'
 
+    def save(self, *args, **kwargs):
+        self.address_key = normalize_address(self.address)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'address' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'address_key'}
+        super().save(*args, **kwargs)
+
+    def update_total(self):
+        self.total = self.items.aggregate(
+            total=Sum(F('quantity') * F('price'))
+        )['total'] or 0
+        self.save(update_fields=['total'])
+
 
 class OrderMenuItem(models.Model):
     order = models.ForeignKey(
@@ -334,3 +611,131 @@ class OrderMenuItem(models.Model):
 
     def __str__(self):
         return f'{self.product.name} {self.order}'
+
+
+class OrderCandidateRestaurant(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='candidate_restaurants',
+        verbose_name='заказ'
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name='candidate_orders',
+        verbose_name='ресторан'
+    )
+    distance_km = models.FloatField(
+        null=True,
+        blank=True,
+        verbose_name='расстояние, км'
+    )
+
+    class Meta:
+        verbose_name = 'ресторан, который может приготовить заказ'
+        verbose_name_plural = 'рестораны, которые могут приготовить заказ'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+
+    def __str__(self):
+        return f'{self.restaurant} {self.order}'
+
+
+IDEMPOTENCY_KEY_TTL = timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+    def expired(self):
+        return self.filter(created_at__lt=timezone.now() - IDEMPOTENCY_KEY_TTL)
+
+
+class IdempotencyKey(models.Model):
+    KEY_MAX_LENGTH = 255
+
+    key = models.CharField(
+        'ключ',
+        max_length=KEY_MAX_LENGTH,
+        unique=True
+    )
+    request_hash = models.CharField(
+        'хэш запроса',
+        max_length=64
+    )
+    response_status = models.PositiveSmallIntegerField('код ответа')
+    response_data = models.JSONField('ответ')
+    created_at = models.DateTimeField(
+        'создан',
+        default=timezone.now,
+        db_index=True
+    )
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
+
+    def is_expired(self):
+        return self.created_at < timezone.now() - IDEMPOTENCY_KEY_TTL
+
+
+class OrderIntake(models.Model):
+    PENDING = 'pending'
+    PROCESSED = 'processed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (PROCESSED, 'Обработан'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    token = models.UUIDField(
+        'токен',
+        default=uuid.uuid4,
+        unique=True,
+        editable=False
+    )
+    payload = models.JSONField('данные заказа')
+    status = models.CharField(
+        'статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING
+    )
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='intake',
+        verbose_name='заказ'
+    )
+    error = models.JSONField('ошибки', null=True, blank=True)
+    created_at = models.DateTimeField(
+        'поступил',
+        default=timezone.now
+    )
+    processed_at = models.DateTimeField(
+        'обработан',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        verbose_name = 'заказ в очереди'
+        verbose_name_plural = 'заказы в очереди'
+        indexes = [
+            models.Index(
+                fields=['created_at', 'id'],
+                name='orderintake_pending_idx',
+                condition=Q(status='pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return str(self.token)
@@ -0,0 +1,85 @@
+from django.db import transaction
+
+from locations.addresses import normalize_address
+from locations.geo_tools import enqueue_locations, get_or_create_locations
+from .models import Order, OrderMenuItem, Product
+from .serializers import OrderSerializer
+
+
+def get_product_ids(records):
+    return {
+        int(item['product'])
+        for record in records if isinstance(record, dict)
+        for item in record.get('products') or []
+        if isinstance(item, dict) and str(item.get('product')).isdigit()
+    }
+
+
+def validate_orders(records):
+    products = Product.objects.available().in_bulk(get_product_ids(records))
+    locations = get_or_create_locations(
+        [
+            record['address'] for record in records
+            if isinstance(record, dict) and isinstance(record.get('address'), str)
+        ],
+        geocode=False
+    )
+
+    results = []
+    for record in records:
+        serializer = OrderSerializer(
+            data=record,
+            context={'products': products, 'locations': locations}
+        )
+        if serializer.is_valid():
+            results.append((serializer.validated_data, None))
+        else:
+            results.append((None, serializer.errors))
+    return results
+
+
+def build_order(validated_data):
+    return Order(
+        address=validated_data['address'],
+        address_key=normalize_address(validated_data['address']),
+        name=validated_data['name'],
+        last_name=validated_data['last_name'],
+        phonenumber=validated_data['phonenumber'],
+        total=sum(
+            fields['price'] * fields['quantity']
+            for fields in validated_data['products']
+        )
+    )
+
+
+def build_order_items(order, validated_data):
+    return [
+        OrderMenuItem(order=order, **fields)
+        for fields in validated_data['products']
+    ]
+
+
+def schedule_geocoding(orders):
+    addresses = [order.address for order in orders]
+    order_ids = [order.pk for order in orders]
+
+    def enqueue_and_refresh():
+        enqueue_locations(addresses)
+        Order.objects.filter(
+            pk__in=order_ids
+        ).refresh_candidate_restaurants(geocode=False)
+
+    transaction.on_commit(enqueue_and_refresh)
+
+
+def save_orders(validated_orders):
+    orders = Order.objects.bulk_create([
+        build_order(validated_data) for validated_data in validated_orders
+    ])
+    OrderMenuItem.objects.bulk_create([
+        order_item
+        for order, validated_data in zip(orders, validated_orders)
+        for order_item in build_order_items(order, validated_data)
+    ])
+    schedule_geocoding(orders)
+    return orders
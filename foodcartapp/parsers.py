@@ -0,0 +1,33 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    media_type = 'application/x-ndjson'
+
+    class InvalidLine:
+        def __init__(self, error):
+            self.error = error
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+
+        records = []
+        try:
+            for number, line in enumerate(stream, start=1):
+                line = line.decode(encoding).strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError as error:
+                    records.append(self.InvalidLine(
+                        f'Строка {number}: некорректный JSON ({error})'
+                    ))
+        except UnicodeDecodeError as error:
+            raise ParseError(f'Некорректная кодировка: {error}')
+
+        return records
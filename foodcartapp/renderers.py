@@ -0,0 +1,93 @@
+import gzip
+import hashlib
+import json
+
+import brotli
+import orjson
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+
+
+CONTENT_ENCODINGS = ['br', 'gzip']
+
+
+def dumps_with_json(data):
+    return json.dumps(
+        data,
+        cls=DjangoJSONEncoder,
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode()
+
+
+def dumps_with_orjson(data):
+    return orjson.dumps(data, default=DjangoJSONEncoder().default)
+
+
+def dumps(data):
+    return import_string(settings.JSON_DUMPS)(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
+
+
+class CompressedContent:
+    def __init__(self, content):
+        self.etag = f'W/"{hashlib.md5(content).hexdigest()}"'
+        self.variants = {
+            'identity': content,
+            'gzip': gzip.compress(content, compresslevel=9, mtime=0),
+            'br': brotli.compress(content, mode=brotli.MODE_TEXT),
+        }
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(dumps(data))
+
+
+def get_accepted_encoding(request):
+    accepted_encodings = {}
+    for value in request.headers.get('Accept-Encoding', '').split(','):
+        encoding, _, params = value.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0
+        accepted_encodings[encoding.strip().lower()] = quality
+
+    for encoding in CONTENT_ENCODINGS:
+        if accepted_encodings.get(encoding, 0) > 0:
+            return encoding
+    return 'identity'
+
+
+def compressed_json_response(request, compressed_content, max_age=None):
+    response = get_conditional_response(request, etag=compressed_content.etag)
+    if response is None:
+        encoding = get_accepted_encoding(request)
+        response = HttpResponse(
+            compressed_content.variants[encoding],
+            content_type='application/json'
+        )
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+
+    response['ETag'] = compressed_content.etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if max_age is not None:
+        patch_cache_control(response, public=True, max_age=max_age)
+    return response
@@ -1,10 +1,14 @@
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 
-from .models import Order, OrderMenuItem
+from locations.geo_tools import get_or_create_locations
+from .availability import get_availability_index, get_restaurant_grid
+from .models import Order, OrderMenuItem, Product
 
 
 class OrderMenuItemSerializer(serializers.ModelSerializer):
+    product = serializers.IntegerField()
+
     class Meta:
         model = OrderMenuItem
         fields = ['product', 'quantity']
@@ -20,10 +24,58 @@ class OrderSerializer(serializers.ModelSerializer):
     )
 
     def validate_products(self, value):
-        if isinstance(value, list) and len(value) > 0:
-            return value
+        if not isinstance(value, list) or len(value) == 0:
+            raise ValidationError('Отсутствуют ключи продуктов или передан не список')
+
+        product_ids = [fields['product'] for fields in value]
+        if len(set(product_ids)) != len(product_ids):
+            raise ValidationError('Продукты в заказе повторяются')
+
+        products = self.context.get('products')
+        if products is None:
+            products = Product.objects.available().in_bulk(product_ids)
+        unavailable_ids = [
+            product_id for product_id in product_ids
+            if product_id not in products
+        ]
+        if unavailable_ids:
+            raise ValidationError(
+                f'Недопустимые или недоступные продукты: {unavailable_ids}'
+            )
+
+        return [
+            {
+                **fields,
+                'product': products[fields['product']],
+                'price': products[fields['product']].price,
+            }
+            for fields in value
+        ]
+
+    def validate(self, attrs):
+        locations = self.context.get('locations')
+        if locations is None:
+            locations = get_or_create_locations([attrs['address']], geocode=False)
+
+        # Addresses that are not geocoded yet are checked later,
+        # when candidate restaurants are calculated.
+        location = locations.get(attrs['address'])
+        if location is None:
+            return attrs
+
+        # Orders that no restaurant can cook are accepted and left to the
+        # managers, as before.
+        restaurant_ids = get_availability_index().get_restaurant_ids(
+            [fields['product'].pk for fields in attrs['products']]
+        )
+        if not restaurant_ids:
+            return attrs
 
-        raise ValidationError('Отсутствуют ключи продуктов или передан не список')
+        if not get_restaurant_grid().delivers_to(location, restaurant_ids):
+            raise ValidationError({
+                'address': 'Ни один ресторан не доставляет этот заказ по этому адресу'
+            })
+        return attrs
 
     class Meta:
         model = Order
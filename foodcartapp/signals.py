@@ -0,0 +1,221 @@
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from locations.addresses import normalize_address
+from locations.geo_tools import enqueue_locations, get_or_create_locations
+from locations.models import Location
+from locations.signals import locations_geocoded
+from locations.spatial import PolygonZone, RadiusZone
+from .availability import (
+    invalidate_availability_index,
+    invalidate_restaurant_grid,
+)
+from .models import (
+    DeliveryZone,
+    Order,
+    OrderCandidateRestaurant,
+    OrderMenuItem,
+    Product,
+    ProductCategory,
+    Restaurant,
+    RestaurantMenuItem,
+)
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+@receiver(post_delete, sender=RestaurantMenuItem)
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCategory)
+@receiver(post_delete, sender=ProductCategory)
+def reset_availability_index(sender, **kwargs):
+    transaction.on_commit(invalidate_availability_index)
+
+
+def refresh_candidates_on_commit(orders, geocode=True):
+    transaction.on_commit(
+        lambda: orders.refresh_candidate_restaurants(
+            geocoding_timeout=settings.GEOCODER_TIME_BUDGET,
+            geocode=geocode
+        )
+    )
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_save, sender=DeliveryZone)
+@receiver(post_delete, sender=DeliveryZone)
+def reset_restaurant_grid(sender, **kwargs):
+    transaction.on_commit(invalidate_restaurant_grid)
+
+
+def get_delivery_bounds(restaurant, point):
+    # None means that the restaurant can be offered at any address.
+    zones = restaurant.delivery_zones.all()
+    if not zones:
+        if not point or settings.RESTAURANT_SEARCH_RADIUS_KM is None:
+            return None
+        return [RadiusZone(point, settings.RESTAURANT_SEARCH_RADIUS_KM).get_bounds()]
+
+    bounds = []
+    for zone in zones:
+        if zone.polygon is not None:
+            bounds.append(PolygonZone(zone.polygon).get_bounds())
+        elif point:
+            bounds.append(RadiusZone(point, zone.radius_km).get_bounds())
+        else:
+            return None
+    return bounds
+
+
+def get_orders_near_restaurants(restaurant_ids):
+    # Orders that list a restaurant may lose it, and orders located in
+    # its delivery area may gain it.
+    orders = Order.objects.exclude(status=Order.DONE)
+    restaurants = list(
+        Restaurant.objects.filter(
+            pk__in=restaurant_ids
+        ).prefetch_related('delivery_zones')
+    )
+    points = get_or_create_locations(
+        [restaurant.address for restaurant in restaurants],
+        geocode=False
+    )
+
+    located_in_bounds = Q(pk__in=[])
+    for restaurant in restaurants:
+        bounds = get_delivery_bounds(restaurant, points.get(restaurant.address))
+        if bounds is None:
+            return orders
+        for min_lat, min_lon, max_lat, max_lon in bounds:
+            located_in_bounds |= Q(
+                lat__range=(min_lat, max_lat),
+                lon__range=(min_lon, max_lon)
+            )
+
+    return orders.filter(
+        Q(pk__in=OrderCandidateRestaurant.objects.filter(
+            restaurant__in=restaurant_ids
+        ).values('order'))
+        | Q(address_key__in=Location.objects.filter(
+            located_in_bounds
+        ).values('key'))
+    )
+
+
+class OrdersRefresh:
+    def __init__(self):
+        self.restaurant_ids = set()
+        self.product_ids = set()
+        self.is_done = False
+
+    def __call__(self):
+        if self.is_done:
+            return
+        self.is_done = True
+
+        orders = Order.objects.none()
+        if self.restaurant_ids:
+            orders |= get_orders_near_restaurants(self.restaurant_ids)
+        if self.product_ids:
+            orders |= Order.objects.exclude(status=Order.DONE).filter(
+                pk__in=OrderMenuItem.objects.filter(
+                    product__in=self.product_ids
+                ).values('order')
+            )
+        # Addresses are left to the geocode_locations worker, so that an
+        # admin request doesn't wait for the geocoder.
+        orders.refresh_candidate_restaurants(geocode=False)
+
+
+pending_refresh = threading.local()
+
+
+def refresh_orders_on_commit(restaurant_ids=(), product_ids=()):
+    # Changes to the menu and the zones, e.g. saved from an admin inline,
+    # are collected into a single refresh per transaction. Every change
+    # registers the same refresh, so it runs once whichever transaction
+    # commits it, even after a rolled back one.
+    refresh = getattr(pending_refresh, 'refresh', None)
+    if refresh is None or refresh.is_done:
+        refresh = pending_refresh.refresh = OrdersRefresh()
+    refresh.restaurant_ids.update(restaurant_ids)
+    refresh.product_ids.update(product_ids)
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+def refresh_candidates_for_menu_item(sender, instance, created, **kwargs):
+    saved_values = instance.saved_values
+    if created and not instance.availability:
+        return
+    if saved_values == instance.get_tracked_values():
+        return
+
+    product_ids = [instance.product_id]
+    if saved_values is not None:
+        product_ids.append(saved_values['product_id'])
+    refresh_orders_on_commit(product_ids=product_ids)
+
+
+@receiver(post_delete, sender=RestaurantMenuItem)
+def refresh_candidates_for_deleted_menu_item(sender, instance, **kwargs):
+    if instance.availability:
+        refresh_orders_on_commit(product_ids=[instance.product_id])
+
+
+@receiver(post_save, sender=DeliveryZone)
+@receiver(post_delete, sender=DeliveryZone)
+def refresh_candidates_for_delivery_zone(sender, instance, **kwargs):
+    refresh_orders_on_commit(restaurant_ids=[instance.restaurant_id])
+
+
+@receiver(post_save, sender=Restaurant)
+def enqueue_restaurant_location(sender, instance, **kwargs):
+    address = instance.address
+    transaction.on_commit(lambda: enqueue_locations([address]))
+
+
+@receiver(post_save, sender=Restaurant)
+def refresh_candidates_for_restaurant(sender, instance, created, **kwargs):
+    if created:
+        return
+    refresh_orders_on_commit(restaurant_ids=[instance.pk])
+
+
+def get_active_orders_at(addresses):
+    return Order.objects.exclude(status=Order.DONE).filter(
+        address_key__in={normalize_address(address) for address in addresses}
+    )
+
+
+@receiver(post_save, sender=Location)
+def refresh_candidates_for_location(sender, instance, **kwargs):
+    refresh_candidates_on_commit(get_active_orders_at([instance.address]))
+
+
+@receiver(locations_geocoded)
+def refresh_candidates_for_geocoded(sender, addresses, **kwargs):
+    keys = {normalize_address(address) for address in addresses}
+    restaurant_ids = [
+        restaurant_id
+        for restaurant_id, address in Restaurant.objects.values_list(
+            'pk',
+            'address'
+        )
+        if normalize_address(address) in keys
+    ]
+    if restaurant_ids:
+        transaction.on_commit(invalidate_restaurant_grid)
+
+    orders = get_active_orders_at(addresses)
+    if restaurant_ids:
+        orders |= get_orders_near_restaurants(restaurant_ids)
+    refresh_candidates_on_commit(orders, geocode=False)
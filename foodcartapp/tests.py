@@ -0,0 +1,244 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from locations.addresses import normalize_address
+from locations.models import Location
+from .availability import (
+    get_availability_index,
+    get_restaurant_grid,
+    invalidate_availability_index,
+    invalidate_restaurant_grid,
+)
+from .models import (
+    IDEMPOTENCY_KEY_TTL,
+    DeliveryZone,
+    IdempotencyKey,
+    Order,
+    OrderCandidateRestaurant,
+    Product,
+    Restaurant,
+    RestaurantMenuItem,
+)
+
+
+def create_location(address, lat, lon):
+    return Location.objects.create(
+        address=address,
+        key=normalize_address(address),
+        lat=lat,
+        lon=lon,
+        status=Location.FOUND
+    )
+
+
+class RegisterOrderQueriesTest(TestCase):
+    order_address = 'Москва, ул. Тверская 1'
+
+    @classmethod
+    def setUpTestData(cls):
+        restaurant = Restaurant.objects.create(
+            name='Star Burger',
+            address='Москва, ул. Арбат 1'
+        )
+        cls.product = Product.objects.create(
+            name='Чизбургер',
+            price=100,
+            image='burger.jpg'
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=restaurant,
+            product=cls.product
+        )
+        create_location(restaurant.address, 55.751, 37.592)
+        create_location(cls.order_address, 55.757, 37.614)
+
+    def setUp(self):
+        # The indexes live in the process, so they are rebuilt from this
+        # test's data before the queries are counted.
+        invalidate_availability_index()
+        invalidate_restaurant_grid()
+        get_availability_index()
+        get_restaurant_grid()
+
+    def register_order(self, **headers):
+        # Callbacks run after the commit, e.g. the candidate restaurants
+        # refresh, are not part of the request and are not counted.
+        return self.client.post(
+            '/api/order/',
+            {
+                'firstname': 'Иван',
+                'lastname': 'Петров',
+                'phonenumber': '+79291000000',
+                'address': self.order_address,
+                'products': [{'product': self.product.pk, 'quantity': 2}],
+            },
+            content_type='application/json',
+            **headers
+        )
+
+    def test_without_idempotency_key(self):
+        # Products and the address, then the savepoint with the order
+        # and its items.
+        with self.assertNumQueries(6):
+            response = self.register_order()
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_with_new_idempotency_key(self):
+        # The key lookup and the key itself are added to the above.
+        with self.assertNumQueries(8):
+            response = self.register_order(HTTP_IDEMPOTENCY_KEY='new-key')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(IdempotencyKey.objects.filter(key='new-key').exists())
+
+    def test_replay_with_idempotency_key(self):
+        first_response = self.register_order(HTTP_IDEMPOTENCY_KEY='replay-key')
+
+        with self.assertNumQueries(1):
+            response = self.register_order(HTTP_IDEMPOTENCY_KEY='replay-key')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), first_response.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_other_integrity_errors_are_not_replayed(self):
+        with mock.patch(
+            'foodcartapp.views.save_orders',
+            side_effect=IntegrityError
+        ):
+            with self.assertRaises(IntegrityError):
+                self.register_order(HTTP_IDEMPOTENCY_KEY='broken-key')
+
+    def test_candidates_are_calculated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.register_order()
+
+        self.assertEqual(
+            OrderCandidateRestaurant.objects.filter(
+                order=response.json()['id']
+            ).count(),
+            1
+        )
+
+    def test_expired_idempotency_key_is_not_replayed(self):
+        self.register_order(HTTP_IDEMPOTENCY_KEY='old-key')
+        IdempotencyKey.objects.update(
+            created_at=timezone.now() - IDEMPOTENCY_KEY_TTL
+        )
+
+        response = self.register_order(HTTP_IDEMPOTENCY_KEY='old-key')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class RegisterOrderDeliveryTest(TestCase):
+    order_address = 'Москва, ул. Тверская 1'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.burger = Product.objects.create(
+            name='Чизбургер',
+            price=100,
+            image='burger.jpg'
+        )
+        cls.shake = Product.objects.create(
+            name='Молочный коктейль',
+            price=50,
+            image='shake.jpg'
+        )
+        # Both restaurants are farther than the search radius.
+        cls.burger_restaurant = Restaurant.objects.create(
+            name='Star Burger Тверь',
+            address='Тверь, ул. Советская 1'
+        )
+        shake_restaurant = Restaurant.objects.create(
+            name='Star Burger Рязань',
+            address='Рязань, ул. Почтовая 1'
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=cls.burger_restaurant,
+            product=cls.burger
+        )
+        RestaurantMenuItem.objects.create(
+            restaurant=shake_restaurant,
+            product=cls.shake
+        )
+        create_location(cls.burger_restaurant.address, 56.858, 35.917)
+        create_location(shake_restaurant.address, 54.629, 39.742)
+        create_location(cls.order_address, 55.757, 37.614)
+
+    def setUp(self):
+        invalidate_availability_index()
+        invalidate_restaurant_grid()
+
+    def register_order(self, *products):
+        return self.client.post(
+            '/api/order/',
+            {
+                'firstname': 'Иван',
+                'lastname': 'Петров',
+                'phonenumber': '+79291000000',
+                'address': self.order_address,
+                'products': [
+                    {'product': product.pk, 'quantity': 1}
+                    for product in products
+                ],
+            },
+            content_type='application/json'
+        )
+
+    def test_order_no_restaurant_can_cook_is_accepted(self):
+        response = self.register_order(self.burger, self.shake)
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_radius_is_not_checked(self):
+        response = self.register_order(self.burger)
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_address_outside_delivery_zones_is_rejected(self):
+        DeliveryZone.objects.create(
+            restaurant=self.burger_restaurant,
+            radius_km=10
+        )
+        invalidate_restaurant_grid()
+
+        response = self.register_order(self.burger)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('address', response.json())
+
+
+class RegisterOrdersBatchAuthTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        partner = User.objects.create_user(username='partner')
+        cls.token = Token.objects.create(user=partner)
+
+    def register_orders(self, **headers):
+        return self.client.post(
+            '/api/orders/batch/',
+            [],
+            content_type='application/json',
+            **headers
+        )
+
+    def test_anonymous_request_is_rejected(self):
+        response = self.register_orders()
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_partner_token_is_accepted(self):
+        response = self.register_orders(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+        self.assertEqual(response.status_code, 200)
@@ -1,6 +1,12 @@
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import (
+    banners_list_api,
+    order_intake_status,
+    product_list_api,
+    register_order,
+    register_orders_batch,
+)
 
 
 app_name = "foodcartapp"
@@ -9,4 +15,6 @@ urlpatterns = [
     path('products/', product_list_api),
     path('banners/', banners_list_api),
     path('order/', register_order),
+    path('order/<uuid:token>/', order_intake_status),
+    path('orders/batch/', register_orders_batch),
 ]
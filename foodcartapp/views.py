@@ -1,16 +1,36 @@
-from django.http import JsonResponse
+from functools import lru_cache
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
 from django.templatetags.static import static
-from django.db import transaction
-from rest_framework.decorators import api_view
+from django.db import IntegrityError, transaction
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    parser_classes,
+    permission_classes,
+)
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from .models import Product, Order, OrderMenuItem
+from .availability import get_index_version
+from .models import IdempotencyKey, OrderIntake, Product
+from .order_registration import save_orders, validate_orders
+from .parsers import NDJSONParser
+from .renderers import CompressedContent, compressed_json_response
 from .serializers import OrderSerializer
 
 
-def banners_list_api(request):
+@lru_cache(maxsize=None)
+def get_banners_content():
     # FIXME move data to db?
-    return JsonResponse([
+    return CompressedContent.from_data([
         {
             'title': 'Burger',
             'src': static('burger.jpg'),
@@ -26,13 +46,19 @@ def banners_list_api(request):
             'src': static('tasty.jpg'),
             'text': 'Food is incomplete without a tasty dessert',
         }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    ])
 
 
-def product_list_api(request):
+def banners_list_api(request):
+    return compressed_json_response(request, get_banners_content())
+
+
+def get_products_snapshot():
+    cache_key = f'foodcartapp:products-snapshot:{get_index_version()}'
+    snapshot = cache.get(cache_key)
+    if snapshot is not None:
+        return snapshot
+
     products = Product.objects.select_related('category').available()
     dumped_products = []
     for product in products:
@@ -53,33 +79,163 @@ def product_list_api(request):
             }
         }
         dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+
+    snapshot = CompressedContent.from_data(dumped_products)
+    # The snapshot is useless once the version in its key expires, so it
+    # doesn't outlive it.
+    cache.set(cache_key, snapshot, timeout=settings.CACHE_VERSION_TIMEOUT)
+    return snapshot
+
+
+def product_list_api(request):
+    return compressed_json_response(
+        request,
+        get_products_snapshot(),
+        max_age=settings.PRODUCTS_API_MAX_AGE
+    )
+
+
+def get_request_hash(data):
+    canonical_data = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(canonical_data.encode()).hexdigest()
+
+
+def replay_response(stored_key, request_hash):
+    if request_hash != stored_key.request_hash:
+        return Response(
+            {'Idempotency-Key': ['Ключ уже использован для другого запроса']},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    return Response(
+        stored_key.response_data,
+        status=stored_key.response_status
+    )
 
 
-@transaction.atomic
 @api_view(['POST'])
 def register_order(request):
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None:
+        if not 0 < len(idempotency_key) <= IdempotencyKey.KEY_MAX_LENGTH:
+            return Response(
+                {'Idempotency-Key': ['Недопустимый ключ идемпотентности']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        request_hash = get_request_hash(request.data)
+        stored_key = IdempotencyKey.objects.filter(key=idempotency_key).first()
+        if stored_key and stored_key.is_expired():
+            stored_key.delete()
+        elif stored_key:
+            return replay_response(stored_key, request_hash)
+
     serializer = OrderSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     validated_data = serializer.validated_data
 
-    order = Order.objects.create(
-        address=validated_data['address'],
-        name=validated_data['name'],
-        last_name=validated_data['last_name'],
-        phonenumber=validated_data['phonenumber']
+    try:
+        with transaction.atomic():
+            if settings.ORDER_INTAKE_MODE == 'queue':
+                intake = OrderIntake.objects.create(payload=request.data)
+                response_status = status.HTTP_202_ACCEPTED
+                response_data = {'token': str(intake.token)}
+            else:
+                order, = save_orders([validated_data])
+                response_status = status.HTTP_200_OK
+                response_data = {
+                    'id': order.pk,
+                    'firstname': order.name,
+                    'lastname': order.last_name,
+                    'address': order.address,
+                    'phonenumber': str(order.phonenumber),
+                }
+
+            if idempotency_key is not None:
+                IdempotencyKey.objects.create(
+                    key=idempotency_key,
+                    request_hash=request_hash,
+                    response_status=response_status,
+                    response_data=response_data
+                )
+    except IntegrityError:
+        if idempotency_key is None:
+            raise
+        # Only a concurrent request with the same key is replayed, any
+        # other integrity error is not ours to hide.
+        stored_key = IdempotencyKey.objects.filter(key=idempotency_key).first()
+        if stored_key is None:
+            raise
+        return replay_response(stored_key, request_hash)
+
+    return Response(response_data, status=response_status)
+
+
+@api_view(['GET'])
+def order_intake_status(request, token):
+    intake = get_object_or_404(
+        OrderIntake.objects.only('status', 'order_id', 'error'),
+        token=token
+    )
+    return Response({
+        'token': str(token),
+        'status': intake.status,
+        'id': intake.order_id,
+        'errors': intake.error or None,
+    })
+
+
+@api_view(['POST'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, NDJSONParser])
+def register_orders_batch(request):
+    records = request.data
+    if not isinstance(records, list):
+        return Response(
+            {'non_field_errors': ['Ожидается список заказов']},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(records) > settings.ORDERS_BATCH_MAX_SIZE:
+        return Response(
+            {'non_field_errors': [
+                f'Не больше {settings.ORDERS_BATCH_MAX_SIZE} заказов за раз'
+            ]},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    results = [None] * len(records)
+    records_to_validate = []
+    for index, record in enumerate(records):
+        if isinstance(record, NDJSONParser.InvalidLine):
+            results[index] = {
+                'index': index,
+                'errors': {'non_field_errors': [record.error]},
+            }
+        else:
+            records_to_validate.append((index, record))
+
+    validation_results = validate_orders(
+        [record for _, record in records_to_validate]
     )
+    valid_records = []
+    for (index, _), (validated_data, errors) in zip(
+        records_to_validate,
+        validation_results
+    ):
+        if errors:
+            results[index] = {'index': index, 'errors': errors}
+        else:
+            valid_records.append((index, validated_data))
 
-    order_items = [
-        OrderMenuItem(order=order, price=fields['product'].price, **fields)
-        for fields in validated_data['products']
-    ]
+    with transaction.atomic():
+        orders = save_orders(
+            [validated_data for _, validated_data in valid_records]
+        )
 
-    OrderMenuItem.objects.bulk_create(order_items)
+    for order, (index, _) in zip(orders, valid_records):
+        results[index] = {'index': index, 'id': order.pk}
 
-    if serializer.is_valid:
-        return Response(OrderSerializer(order).data)
-    return JsonResponse(serializer.errors, status=400)
+    return Response({
+        'created': len(orders),
+        'failed': len(records) - len(orders),
+        'results': results,
+    })
@@ -0,0 +1,36 @@
+import re
+
+
+ADDRESS_ABBREVIATIONS = {
+    'улица': 'ул',
+    'проспект': 'пр-т',
+    'просп': 'пр-т',
+    'пр-кт': 'пр-т',
+    'переулок': 'пер',
+    'площадь': 'пл',
+    'шоссе': 'ш',
+    'бульвар': 'б-р',
+    'бул': 'б-р',
+    'набережная': 'наб',
+    'проезд': 'пр-д',
+    'корпус': 'к',
+    'корп': 'к',
+    'строение': 'стр',
+    'квартира': 'кв',
+    'область': 'обл',
+    'район': 'р-н',
+}
+STREET_TYPES = {'ул', 'пр-т', 'пер', 'пл', 'ш', 'б-р', 'наб', 'пр-д'}
+ADDRESS_FILLER_WORDS = {'г', 'город', 'д', 'дом', 'россия', 'рф'}
+ADDRESS_KEY_MAX_LENGTH = 255
+
+
+def normalize_address(address):
+    address = address.lower().replace('ё', 'е')
+    address = re.sub(r'(?<=\d)(?=[^\W\d_])|(?<=[^\W\d_])(?=\d)', ' ', address)
+    tokens = []
+    for token in re.findall(r'\w+(?:-\w+)*', address):
+        token = ADDRESS_ABBREVIATIONS.get(token, token)
+        if token not in ADDRESS_FILLER_WORDS:
+            tokens.append(token)
+    return ' '.join(tokens)[:ADDRESS_KEY_MAX_LENGTH]
@@ -0,0 +1,158 @@
+from collections import OrderedDict
+import threading
+
+from django.conf import settings
+
+from .addresses import normalize_address
+from .geo_tools import calc_distance_matrix, get_point
+from .models import Location, LocationDistance
+
+
+class DistanceCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.distances = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_pair_distances(self, pairs):
+        # Pairs are keyed by coordinates, so once a location is moved
+        # its old entries are no longer hit and fall out of the cache.
+        keys = [
+            (get_point(point_from), get_point(point_to))
+            for point_from, point_to in pairs
+        ]
+
+        distances = {}
+        with self.lock:
+            for key in keys:
+                distance = self.distances.get(key)
+                if distance is not None:
+                    self.distances.move_to_end(key)
+                    distances[key] = distance
+
+        missing_keys = list(dict.fromkeys(
+            key for key in keys if key not in distances
+        ))
+        if missing_keys:
+            # Missing pairs are calculated as one matrix of the points
+            # involved, but only the requested pairs are kept.
+            points_from = list(dict.fromkeys(key[0] for key in missing_keys))
+            points_to = list(dict.fromkeys(key[1] for key in missing_keys))
+            rows = {point: row for row, point in enumerate(points_from)}
+            columns = {point: column for column, point in enumerate(points_to)}
+            matrix = calc_distance_matrix(points_from, points_to)
+            calculated_distances = {
+                key: matrix[rows[key[0]]][columns[key[1]]]
+                for key in missing_keys
+            }
+            self.update(calculated_distances.items())
+            distances.update(calculated_distances)
+
+        return [distances[key] for key in keys]
+
+    def update(self, distances):
+        if not self.maxsize:
+            return
+        with self.lock:
+            for key, distance in distances:
+                self.distances[key] = distance
+                self.distances.move_to_end(key)
+            while len(self.distances) > self.maxsize:
+                self.distances.popitem(last=False)
+
+
+distance_cache = DistanceCache(settings.DISTANCE_CACHE_SIZE)
+
+
+def load_distances(addresses_from, addresses_to):
+    if not settings.DISTANCE_CACHE_DB:
+        return set()
+
+    stored_distances = LocationDistance.objects.filter(
+        location_from__key__in={
+            normalize_address(address) for address in addresses_from
+        },
+        location_to__key__in={
+            normalize_address(address) for address in addresses_to
+        },
+    ).values_list(
+        'location_from__key',
+        'location_from__lat',
+        'location_from__lon',
+        'location_to__key',
+        'location_to__lat',
+        'location_to__lon',
+        'distance_km',
+    )
+
+    stored_pairs = set()
+    cached_distances = []
+    for (
+        key_from, lat_from, lon_from, key_to, lat_to, lon_to, distance_km
+    ) in stored_distances:
+        stored_pairs.add((key_from, key_to))
+        point_from = get_point((lat_from, lon_from))
+        point_to = get_point((lat_to, lon_to))
+        cached_distances.append(((point_from, point_to), distance_km))
+    distance_cache.update(cached_distances)
+
+    return stored_pairs
+
+
+def is_located_at(location, point):
+    return (
+        location is not None
+        and get_point(location.coordinates) == get_point(point)
+    )
+
+
+def save_distances(distances, stored_pairs=()):
+    if not settings.DISTANCE_CACHE_DB:
+        return
+
+    distances_by_addresses = {
+        (address_from, address_to): (point_from, point_to, distance_km)
+        for address_from, point_from, address_to, point_to, distance_km
+        in distances
+    }
+    keys = {
+        address: normalize_address(address)
+        for address in {
+            address
+            for addresses in distances_by_addresses
+            for address in addresses
+        }
+    }
+    new_distances = {}
+    for (address_from, address_to), distance in distances_by_addresses.items():
+        pair = (keys[address_from], keys[address_to])
+        if pair not in stored_pairs:
+            new_distances[pair] = distance
+    if not new_distances:
+        return
+
+    locations = {
+        location.key: location
+        for location in Location.objects.filter(
+            key__in={key for pair in new_distances for key in pair}
+        ).only('key', 'lat', 'lon')
+    }
+
+    # Distances calculated from coordinates that have changed since are
+    # dropped rather than stored.
+    location_distances = []
+    for (key_from, key_to), distance in new_distances.items():
+        point_from, point_to, distance_km = distance
+        location_from = locations.get(key_from)
+        location_to = locations.get(key_to)
+        if not (
+            is_located_at(location_from, point_from)
+            and is_located_at(location_to, point_to)
+        ):
+            continue
+        location_distances.append(LocationDistance(
+            location_from=location_from,
+            location_to=location_to,
+            distance_km=distance_km
+        ))
+    LocationDistance.objects.bulk_create(location_distances, ignore_conflicts=True)
@@ -0,0 +1,136 @@
+from bisect import bisect_left
+import csv
+import difflib
+from functools import lru_cache
+
+from django.conf import settings
+
+from .addresses import STREET_TYPES, normalize_address
+
+
+def get_street_name(tokens):
+    return ' '.join(token for token in tokens if token not in STREET_TYPES)
+
+
+class Gazetteer:
+    fuzzy_cutoff = 0.85
+
+    def __init__(self, rows, city):
+        self.city = normalize_address(city)
+        self.houses_by_street = {}
+        for street, house, lat, lon in rows:
+            street_houses = self.houses_by_street.setdefault(
+                normalize_address(street),
+                {}
+            )
+            house = normalize_address(house)
+            coordinates = (float(lat), float(lon))
+            street_houses[house] = coordinates
+            # Without a corpus or building the house number alone
+            # points to the first building with that number.
+            street_houses.setdefault(house.split()[0], coordinates)
+
+        streets_by_name = {}
+        for street in self.houses_by_street:
+            streets_by_name.setdefault(
+                get_street_name(street.split()),
+                []
+            ).append(street)
+        # Names shared by several streets (ул. Ленина and пр-т Ленина)
+        # are only matched together with the street type.
+        self.streets_by_name = {
+            name: streets[0]
+            for name, streets in streets_by_name.items()
+            if len(streets) == 1
+        }
+        self.street_names = sorted(self.streets_by_name)
+
+    @classmethod
+    def from_csv(cls, path, city):
+        with open(path, encoding='utf-8', newline='') as file:
+            reader = csv.DictReader(file)
+            return cls(
+                (
+                    (row['street'], row['house'], row['lat'], row['lon'])
+                    for row in reader
+                ),
+                city
+            )
+
+    def resolve(self, address):
+        tokens = normalize_address(address).split()
+        house_start = next(
+            (
+                index for index in range(1, len(tokens))
+                if tokens[index][0].isdigit()
+            ),
+            None
+        )
+        if house_start is None:
+            return None
+
+        street = self.find_street(tokens[:house_start])
+        if street is None:
+            return None
+
+        houses = self.houses_by_street[street]
+        house_tokens = tokens[house_start:]
+        return houses.get(' '.join(house_tokens)) or houses.get(house_tokens[0])
+
+    def find_street(self, street_tokens):
+        # The address may start with a city or district the gazetteer
+        # does not store, so every tail of the street part is tried,
+        # from exact to fuzzy matches. Whatever precedes the street has
+        # to name the gazetteer's city, or the same street name in
+        # another city would be matched.
+        tails = [
+            street_tokens[start:]
+            for start in range(len(street_tokens))
+            if self.is_local(street_tokens[:start])
+        ]
+
+        for tail in tails:
+            street = ' '.join(tail)
+            if street in self.houses_by_street:
+                return street
+
+        names = [get_street_name(tail) for tail in tails]
+        for name in names:
+            if name in self.streets_by_name:
+                return self.streets_by_name[name]
+
+        for name in names:
+            prefix_matches = self.get_prefix_matches(name)
+            if len(prefix_matches) == 1:
+                return self.streets_by_name[prefix_matches[0]]
+
+        for name in names:
+            close_names = difflib.get_close_matches(
+                name,
+                self.get_prefix_matches(name[:1]),
+                n=1,
+                cutoff=self.fuzzy_cutoff
+            )
+            if close_names:
+                return self.streets_by_name[close_names[0]]
+
+        return None
+
+    def is_local(self, leading_tokens):
+        if not leading_tokens:
+            return True
+        return f' {self.city} ' in f' {" ".join(leading_tokens)} '
+
+    def get_prefix_matches(self, prefix):
+        if not prefix:
+            return []
+        start = bisect_left(self.street_names, prefix)
+        end = bisect_left(self.street_names, prefix + '\uffff')
+        return self.street_names[start:end]
+
+
+@lru_cache(maxsize=None)
+def get_gazetteer():
+    if not settings.GAZETTEER_PATH:
+        return None
+    return Gazetteer.from_csv(settings.GAZETTEER_PATH, settings.GAZETTEER_CITY)
@@ -1,65 +1,370 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+import logging
+import threading
+import time
+
+import numpy as np
 from geopy import distance
 
 from django.conf import settings
-from .models import Location
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .addresses import normalize_address
+from .gazetteer import get_gazetteer
+from .geocoders import GeocoderUnavailable, get_geocoder
+from .models import Location, LocationDistance
+from .signals import locations_geocoded
+
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=settings.GEOCODER_MAX_WORKERS)
+pending_lookups = {}
+pending_lookups_lock = threading.Lock()
+LOOKUP_LEASE = timedelta(minutes=1)
+LOCATION_RESULT_FIELDS = [
+    'lat',
+    'lon',
+    'status',
+    'date',
+    'attempts',
+    'next_attempt_at',
+    'leased_until',
+]
+
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        time.sleep(slot - now)
+
+
+rate_limiter = RateLimiter(settings.GEOCODER_RATE_LIMIT)
 
 
 def fetch_coordinates(address):
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    response = requests.get(base_url, params={
-        "geocode": address,
-        "apikey": settings.YANDEX_API_KEY,
-        "format": "json",
-    })
-    response.raise_for_status()
-    found_places = response.json()['response']['GeoObjectCollection']['featureMember']
-
-    if not found_places:
-        return None
+    rate_limiter.wait()
+    return get_geocoder().geocode(address)
+
+
+def fetch_coordinates_batch(addresses, timeout=None):
+    fetched_coordinates = {}
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        for address in addresses:
+            coordinates = gazetteer.resolve(address)
+            if coordinates is not None:
+                fetched_coordinates[address] = coordinates
+
+    with pending_lookups_lock:
+        lookups = {}
+        for address in addresses:
+            if address in fetched_coordinates:
+                continue
+            key = normalize_address(address)
+            if key not in pending_lookups:
+                pending_lookups[key] = executor.submit(
+                    fetch_coordinates,
+                    address
+                )
+            lookups[address] = (key, pending_lookups[key])
 
-    most_relevant = found_places[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(' ')
+    wait([lookup for _, lookup in lookups.values()], timeout=timeout)
 
-    return lat, lon
+    failed_addresses = []
+    for address, (key, lookup) in lookups.items():
+        if not lookup.done():
+            # Lookups that miss the deadline keep running and store
+            # their result themselves.
+            lookup.add_done_callback(
+                lambda lookup, key=key, address=address: executor.submit(
+                    store_late_lookup,
+                    key,
+                    address,
+                    lookup
+                )
+            )
+            continue
+
+        pop_pending_lookup(key, lookup)
+
+        error = lookup.exception()
+        if error is None:
+            fetched_coordinates[address] = lookup.result()
+        else:
+            logger.warning('Geocoding failed: %s', error)
+            if not isinstance(error, GeocoderUnavailable):
+                failed_addresses.append(address)
+
+    store_failures(failed_addresses)
+    return fetched_coordinates
+
+
+def pop_pending_lookup(key, lookup):
+    with pending_lookups_lock:
+        if pending_lookups.get(key) is not lookup:
+            return False
+        del pending_lookups[key]
+        return True
+
+
+def store_late_lookup(key, address, lookup):
+    if not pop_pending_lookup(key, lookup):
+        return
+
+    error = lookup.exception()
+    try:
+        if error is None:
+            store_coordinates({address: lookup.result()})
+            locations_geocoded.send(sender=Location, addresses=[address])
+            return
+
+        logger.warning('Geocoding failed: %s', error)
+        if not isinstance(error, GeocoderUnavailable):
+            store_failures([address])
+    except Exception:
+        logger.exception('Failed to store coordinates of %r', address)
+    finally:
+        connection.close()
 
 
 def calc_distance(point_one, point_two):
     return round(distance.distance(point_one, point_two).km, 2)
 
 
-def get_or_create_locations(addresses):
-    locations_with_coords = {
-        location.address: (location.lat, location.lon)
-        for location in Location.objects.filter(address__in=addresses)
+def calc_geodesic_matrix(points_from, points_to, iterations=100):
+    # Vincenty's inverse formula on the WGS-84 ellipsoid, evaluated for
+    # every pair at once. It agrees with geopy's geodesic well below the
+    # 10 m rounding step for any pair of points in one city.
+    a = 6378137.0
+    f = 1 / 298.257223563
+    b = (1 - f) * a
+
+    lat_from, lon_from = np.radians(
+        np.asarray(points_from, dtype=float).reshape(-1, 2)
+    ).T
+    lat_to, lon_to = np.radians(
+        np.asarray(points_to, dtype=float).reshape(-1, 2)
+    ).T
+
+    u_from = np.arctan((1 - f) * np.tan(lat_from))[:, np.newaxis]
+    u_to = np.arctan((1 - f) * np.tan(lat_to))[np.newaxis, :]
+    sin_u_from, cos_u_from = np.sin(u_from), np.cos(u_from)
+    sin_u_to, cos_u_to = np.sin(u_to), np.cos(u_to)
+
+    lon_diff = lon_to[np.newaxis, :] - lon_from[:, np.newaxis]
+    lambda_ = lon_diff
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(iterations):
+            sin_lambda, cos_lambda = np.sin(lambda_), np.cos(lambda_)
+            sin_sigma = np.hypot(
+                cos_u_to * sin_lambda,
+                cos_u_from * sin_u_to - sin_u_from * cos_u_to * cos_lambda
+            )
+            cos_sigma = sin_u_from * sin_u_to + cos_u_from * cos_u_to * cos_lambda
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(
+                sin_sigma == 0,
+                0,
+                cos_u_from * cos_u_to * sin_lambda / sin_sigma
+            )
+            cos_sq_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(
+                cos_sq_alpha == 0,
+                0,
+                cos_sigma - 2 * sin_u_from * sin_u_to / cos_sq_alpha
+            )
+            c = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+            previous_lambda = lambda_
+            lambda_ = lon_diff + (1 - c) * f * sin_alpha * (
+                sigma + c * sin_sigma * (
+                    cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                )
+            )
+            if np.all(np.abs(lambda_ - previous_lambda) < 1e-12):
+                break
+
+    u_sq = cos_sq_alpha * (a ** 2 - b ** 2) / b ** 2
+    big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = big_b * sin_sigma * (
+        cos_2sigma_m + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - big_b / 6 * cos_2sigma_m
+            * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+        )
+    )
+
+    return b * big_a * (sigma - delta_sigma) / 1000
+
+
+def calc_distance_matrix(points_from, points_to):
+    if not points_from or not points_to:
+        return [[] for _ in points_from]
+
+    if settings.DISTANCE_ENGINE == 'geopy':
+        return [
+            [calc_distance(point_from, point_to) for point_to in points_to]
+            for point_from in points_from
+        ]
+
+    distances = calc_geodesic_matrix(points_from, points_to)
+    return np.round(distances, 2).tolist()
+
+
+def get_locations(addresses):
+    keys = {normalize_address(address) for address in addresses}
+    return {
+        location.key: location
+        for location in Location.objects.filter(key__in=keys)
     }
 
-    new_locations = []
 
-    for address in addresses:
-        if address in locations_with_coords.keys():
+def get_point(coordinates):
+    if coordinates is None:
+        return None
+    lat, lon = coordinates
+    return float(lat), float(lon)
+
+
+def store_coordinates(fetched_coordinates):
+    addresses_by_key = {
+        normalize_address(address): address for address in fetched_coordinates
+    }
+
+    existing_locations = list(
+        Location.objects.filter(key__in=addresses_by_key)
+    )
+    moved_locations = []
+    for location in existing_locations:
+        previous_point = get_point(location.coordinates)
+        location.set_coordinates(
+            fetched_coordinates[addresses_by_key[location.key]]
+        )
+        if get_point(location.coordinates) != previous_point:
+            moved_locations.append(location)
+    Location.objects.bulk_update(existing_locations, LOCATION_RESULT_FIELDS)
+    if moved_locations:
+        LocationDistance.objects.for_locations(moved_locations).delete()
+
+    # A row inserted by another process in the meantime wins the conflict
+    # and is refreshed later like any other entry.
+    existing_keys = {location.key for location in existing_locations}
+    new_locations = []
+    for key, address in addresses_by_key.items():
+        if key in existing_keys:
             continue
+        location = Location(address=address, key=key)
+        location.set_coordinates(fetched_coordinates[address])
+        new_locations.append(location)
+    Location.objects.bulk_create(new_locations, ignore_conflicts=True)
 
-        coordinates = fetch_coordinates(address)
+    return {
+        key: fetched_coordinates[address]
+        for key, address in addresses_by_key.items()
+    }
 
-        if coordinates:
-            lat, lon = coordinates
-            new_location = Location(
-                address=address,
-                lat=lat,
-                lon=lon
-            )
 
-            locations_with_coords[address] = (lat, lon)
-        else:
-            new_location = Location(
-                address=address
-            )
-            locations_with_coords[address] = None
+def store_failures(addresses):
+    # Addresses the geocoder failed on are retried with the same growing
+    # delay as the ones it didn't find. While the geocoder is unavailable
+    # as a whole, addresses simply stay in the queue.
+    if not addresses:
+        return
+
+    locations = list(Location.objects.filter(
+        key__in={normalize_address(address) for address in addresses}
+    ))
+    for location in locations:
+        location.schedule_retry()
+    Location.objects.bulk_update(
+        locations,
+        ['attempts', 'next_attempt_at', 'leased_until']
+    )
+
+
+def enqueue_locations(addresses):
+    addresses_by_key = {
+        normalize_address(address): address for address in addresses
+    }
+    Location.objects.bulk_create(
+        [
+            Location(address=address, key=key)
+            for key, address in addresses_by_key.items()
+        ],
+        ignore_conflicts=True
+    )
+
 
-        new_locations.append(new_location)
+def claim_locations(locations, limit=None):
+    # A claim is a short lease on a row: while it lasts, other processes
+    # leave the address to the one geocoding it.
+    now = timezone.now()
+    with transaction.atomic():
+        locations = locations.select_for_update(
+            skip_locked=True
+        ).filter(
+            Q(leased_until__isnull=True) | Q(leased_until__lt=now),
+            Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+        ).order_by('id')
+        claimed_locations = {
+            location.key: location for location in locations[:limit]
+        }
+        Location.objects.filter(
+            pk__in=[location.pk for location in claimed_locations.values()]
+        ).update(leased_until=now + LOOKUP_LEASE)
 
-    if len(new_locations) > 0:
-        Location.objects.bulk_create(new_locations)
+    return claimed_locations
 
-    return locations_with_coords
+
+def get_or_create_locations(addresses, timeout=None, geocode=True):
+    keys = {address: normalize_address(address) for address in addresses}
+
+    coordinates_by_key = {
+        key: location.coordinates
+        for key, location in get_locations(addresses).items()
+        if location.status != Location.PENDING
+    }
+
+    if geocode:
+        missing_addresses = {
+            key: address for address, key in keys.items()
+            if key not in coordinates_by_key
+        }
+        if missing_addresses:
+            enqueue_locations(missing_addresses.values())
+            with pending_lookups_lock:
+                own_keys = {
+                    key for key in missing_addresses if key in pending_lookups
+                }
+            own_keys.update(claim_locations(
+                Location.objects.filter(
+                    status=Location.PENDING,
+                    key__in=set(missing_addresses) - own_keys
+                )
+            ))
+
+            fetched_coordinates = fetch_coordinates_batch(
+                [missing_addresses[key] for key in own_keys],
+                timeout=timeout
+            )
+            coordinates_by_key.update(store_coordinates(fetched_coordinates))
+
+    return {
+        address: coordinates_by_key[key]
+        for address, key in keys.items()
+        if key in coordinates_by_key
+    }
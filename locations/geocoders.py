@@ -0,0 +1,160 @@
+from abc import ABC, abstractmethod
+import hashlib
+import json
+import random
+import threading
+import time
+from functools import lru_cache
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .addresses import normalize_address
+
+
+class GeocoderError(Exception):
+    pass
+
+
+class GeocoderUnavailable(GeocoderError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            # Let a single probe through; it either closes the breaker
+            # or keeps it open for another reset_timeout.
+            self.opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class Geocoder(ABC):
+    @abstractmethod
+    def geocode(self, address):
+        pass
+
+
+class YandexGeocoder(Geocoder):
+    base_url = 'https://geocode-maps.yandex.ru/1.x'
+    retry_statuses = {429, 500, 502, 503, 504}
+    retry_delay = 0.2
+
+    def __init__(self):
+        self.api_key = settings.YANDEX_API_KEY
+        self.timeout = (
+            settings.GEOCODER_CONNECT_TIMEOUT,
+            settings.GEOCODER_TIMEOUT,
+        )
+        self.retries = settings.GEOCODER_RETRIES
+        self.circuit_breaker = CircuitBreaker()
+
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.GEOCODER_MAX_WORKERS,
+        ))
+
+    def geocode(self, address):
+        if not self.circuit_breaker.allow_request():
+            raise GeocoderUnavailable('Геокодер временно недоступен')
+
+        try:
+            response = self.request(address)
+        except requests.HTTPError as error:
+            # Other 4xx answers are about this address, not the geocoder,
+            # so they don't open the breaker for everyone else.
+            if self.is_unavailable_status(error.response.status_code):
+                self.circuit_breaker.record_failure()
+            raise GeocoderError(f'Не удалось геокодировать {address!r}') from error
+        except requests.RequestException as error:
+            self.circuit_breaker.record_failure()
+            raise GeocoderError(f'Не удалось геокодировать {address!r}') from error
+
+        self.circuit_breaker.record_success()
+
+        try:
+            found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+        except (ValueError, KeyError) as error:
+            raise GeocoderError(f'Не удалось геокодировать {address!r}') from error
+
+        if not found_places:
+            return None
+
+        most_relevant = found_places[0]
+        lon, lat = most_relevant['GeoObject']['Point']['pos'].split(' ')
+
+        return lat, lon
+
+    @staticmethod
+    def is_unavailable_status(status_code):
+        return status_code == 429 or status_code >= 500
+
+    def request(self, address):
+        for attempt in range(self.retries + 1):
+            is_last_attempt = attempt == self.retries
+            try:
+                response = self.session.get(self.base_url, params={
+                    'geocode': address,
+                    'apikey': self.api_key,
+                    'format': 'json',
+                }, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if is_last_attempt:
+                    raise
+            else:
+                if response.status_code not in self.retry_statuses or is_last_attempt:
+                    response.raise_for_status()
+                    return response
+
+            time.sleep(self.retry_delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+class StubGeocoder(Geocoder):
+    def geocode(self, address):
+        # Stable fake points inside Moscow for running the project offline.
+        digest = hashlib.md5(address.encode()).digest()
+        lat = 55.6 + int.from_bytes(digest[:4], 'big') / 2 ** 32 * 0.3
+        lon = 37.4 + int.from_bytes(digest[4:8], 'big') / 2 ** 32 * 0.4
+        return f'{lat:.6f}', f'{lon:.6f}'
+
+
+class FixtureGeocoder(Geocoder):
+    def __init__(self):
+        with open(settings.GEOCODER_FIXTURE_PATH, encoding='utf-8') as file:
+            fixture = json.load(file)
+        self.coordinates = {
+            normalize_address(address): tuple(coordinates) if coordinates else None
+            for address, coordinates in fixture.items()
+        }
+
+    def geocode(self, address):
+        return self.coordinates.get(normalize_address(address))
+
+
+@lru_cache(maxsize=None)
+def get_geocoder():
+    return import_string(settings.GEOCODER_BACKEND)()
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from locations.geo_tools import (
+    claim_locations,
+    fetch_coordinates_batch,
+    store_coordinates,
+)
+from locations.models import Location
+from locations.signals import locations_geocoded
+
+
+class Command(BaseCommand):
+    help = 'Геокодирует адреса, которые ждут в очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--interval', type=float, default=1)
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать накопившиеся адреса и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            geocoded = self.geocode_batch(options['batch_size'])
+            if geocoded:
+                self.stdout.write(f'Геокодировано адресов: {geocoded}')
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['interval'])
+
+    def geocode_batch(self, batch_size):
+        claimed_locations = claim_locations(
+            Location.objects.filter(status=Location.PENDING),
+            limit=batch_size
+        )
+        if not claimed_locations:
+            return 0
+
+        fetched_coordinates = fetch_coordinates_batch(
+            [location.address for location in claimed_locations.values()]
+        )
+        store_coordinates(fetched_coordinates)
+        locations_geocoded.send(
+            sender=Location,
+            addresses=list(fetched_coordinates)
+        )
+        return len(fetched_coordinates)
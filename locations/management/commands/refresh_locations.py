@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from locations.geo_tools import (
+    claim_locations,
+    fetch_coordinates_batch,
+    store_coordinates,
+)
+from locations.models import Location
+from locations.signals import locations_geocoded
+
+
+class Command(BaseCommand):
+    help = 'Обновляет устаревшие координаты и повторяет неудачные запросы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=1000,
+            help='Сколько адресов обновить за один запуск'
+        )
+
+    def handle(self, *args, **options):
+        refreshed = 0
+        while refreshed < options['limit']:
+            claimed_locations = claim_locations(
+                Location.objects.stale(),
+                limit=min(options['batch_size'], options['limit'] - refreshed)
+            )
+            if not claimed_locations:
+                break
+
+            fetched_coordinates = fetch_coordinates_batch(
+                [location.address for location in claimed_locations.values()]
+            )
+            store_coordinates(fetched_coordinates)
+            locations_geocoded.send(
+                sender=Location,
+                addresses=list(fetched_coordinates)
+            )
+            refreshed += len(claimed_locations)
+
+        self.stdout.write(f'Обновлено адресов: {refreshed}')
@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+
+def set_location_status(apps, schema_editor):
+    Location = apps.get_model('locations', 'Location')
+    Location.objects.filter(lat__isnull=False).update(status='found')
+    Location.objects.filter(lat__isnull=True).update(status='not_found')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0002_auto_20220824_2037'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Ждёт геокодера'), ('found', 'Найден'), ('not_found', 'Не найден')], default='pending', max_length=20, verbose_name='Статус'),
+        ),
+        migrations.RunPython(set_location_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(condition=models.Q(status='pending'), fields=['id'], name='location_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 3.2 on 2026-10-18 03:05
+
+import re
+
+from django.db import migrations, models
+
+
+# A copy of locations.addresses.normalize_address as of this migration,
+# so that later changes to the normalizer don't change what it does.
+ADDRESS_ABBREVIATIONS = {
+    'улица': 'ул',
+    'проспект': 'пр-т',
+    'просп': 'пр-т',
+    'пр-кт': 'пр-т',
+    'переулок': 'пер',
+    'площадь': 'пл',
+    'шоссе': 'ш',
+    'бульвар': 'б-р',
+    'бул': 'б-р',
+    'набережная': 'наб',
+    'проезд': 'пр-д',
+    'корпус': 'к',
+    'корп': 'к',
+    'строение': 'стр',
+    'квартира': 'кв',
+    'область': 'обл',
+    'район': 'р-н',
+}
+ADDRESS_FILLER_WORDS = {'г', 'город', 'д', 'дом', 'россия', 'рф'}
+ADDRESS_KEY_MAX_LENGTH = 255
+
+
+def normalize_address(address):
+    address = address.lower().replace('ё', 'е')
+    address = re.sub(r'(?<=\d)(?=[^\W\d_])|(?<=[^\W\d_])(?=\d)', ' ', address)
+    tokens = []
+    for token in re.findall(r'\w+(?:-\w+)*', address):
+        token = ADDRESS_ABBREVIATIONS.get(token, token)
+        if token not in ADDRESS_FILLER_WORDS:
+            tokens.append(token)
+    return ' '.join(tokens)[:ADDRESS_KEY_MAX_LENGTH]
+
+
+STATUS_PRIORITY = {'found': 0, 'not_found': 1, 'pending': 2}
+
+
+def set_location_keys(apps, schema_editor):
+    Location = apps.get_model('locations', 'Location')
+
+    locations_by_key = {}
+    for location in Location.objects.order_by('-date', '-id'):
+        location.key = normalize_address(location.address)
+        locations_by_key.setdefault(location.key, []).append(location)
+
+    kept_locations = []
+    duplicate_ids = []
+    for locations in locations_by_key.values():
+        locations.sort(key=lambda location: STATUS_PRIORITY[location.status])
+        kept_locations.append(locations[0])
+        duplicate_ids.extend(location.id for location in locations[1:])
+
+    Location.objects.filter(id__in=duplicate_ids).delete()
+    Location.objects.bulk_update(kept_locations, ['key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0003_location_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='location',
+            name='address',
+            field=models.CharField(max_length=200, verbose_name='Адрес'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='key',
+            field=models.CharField(max_length=255, null=True, verbose_name='Нормализованный адрес'),
+        ),
+        migrations.RunPython(set_location_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='location',
+            name='key',
+            field=models.CharField(max_length=255, unique=True, verbose_name='Нормализованный адрес'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0004_location_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='leased_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Геокодируется до'),
+        ),
+    ]
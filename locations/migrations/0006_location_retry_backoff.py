@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0005_location_leased_until'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Неудачных запросов подряд'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Повторить запрос после'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2 on 2026-10-18 02:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0006_location_retry_backoff'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationDistance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.FloatField(verbose_name='Расстояние, км')),
+                ('location_from', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distances_from', to='locations.location', verbose_name='Откуда')),
+                ('location_to', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='distances_to', to='locations.location', verbose_name='Куда')),
+            ],
+            options={
+                'unique_together': {('location_from', 'location_to')},
+            },
+        ),
+    ]
@@ -1,12 +1,151 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
+from .addresses import ADDRESS_KEY_MAX_LENGTH
+
+
+NOT_FOUND_RETRY_DELAY = timedelta(hours=1)
+NOT_FOUND_MAX_RETRY_DELAY = timedelta(days=30)
+
+
+class LocationQuerySet(models.QuerySet):
+    def stale(self):
+        expired_since = timezone.localdate() - timedelta(
+            days=settings.GEOCODER_CACHE_TTL_DAYS
+        )
+        is_due = Q(next_attempt_at__isnull=True) | Q(
+            next_attempt_at__lte=timezone.now()
+        )
+        return self.filter(
+            Q(status=Location.FOUND, date__lt=expired_since) & is_due
+            | Q(status=Location.NOT_FOUND) & is_due
+        )
+
 
 class Location(models.Model):
-    address = models.CharField(max_length=60, unique=True, verbose_name='Адрес')
+    PENDING = 'pending'
+    FOUND = 'found'
+    NOT_FOUND = 'not_found'
+    STATUS_CHOICES = [
+        (PENDING, 'Ждёт геокодера'),
+        (FOUND, 'Найден'),
+        (NOT_FOUND, 'Не найден'),
+    ]
+
+    address = models.CharField(max_length=200, verbose_name='Адрес')
+    key = models.CharField(
+        max_length=ADDRESS_KEY_MAX_LENGTH,
+        unique=True,
+        verbose_name='Нормализованный адрес'
+    )
     lat = models.FloatField(verbose_name='Ширина', null=True, blank=True)
     lon = models.FloatField(verbose_name='Долгота', null=True, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        verbose_name='Статус'
+    )
+    leased_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Геокодируется до'
+    )
     date = models.DateField(
         default=timezone.now,
         verbose_name='Дата запроса к Геокодеру'
     )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Неудачных запросов подряд'
+    )
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Повторить запрос после'
+    )
+
+    objects = LocationQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                name='location_pending_idx',
+                condition=Q(status='pending'),
+            ),
+        ]
+
+    def __str__(self):
+        return self.address
+
+    def schedule_retry(self):
+        self.leased_until = None
+        self.attempts += 1
+        self.next_attempt_at = timezone.now() + min(
+            NOT_FOUND_RETRY_DELAY * 2 ** (self.attempts - 1),
+            NOT_FOUND_MAX_RETRY_DELAY
+        )
+
+    def set_coordinates(self, coordinates):
+        now = timezone.now()
+        self.leased_until = None
+        if coordinates:
+            self.lat, self.lon = coordinates
+            self.status = self.FOUND
+            self.date = now
+            self.attempts = 0
+            self.next_attempt_at = None
+            return
+
+        self.schedule_retry()
+        # A refresh that finds nothing keeps the last known coordinates
+        # and is retried later like a failed lookup.
+        if self.status == self.FOUND:
+            return
+        self.lat, self.lon = None, None
+        self.status = self.NOT_FOUND
+        self.date = now
+
+    @property
+    def coordinates(self):
+        if self.lat is None:
+            return None
+        return self.lat, self.lon
+
+
+class LocationDistanceQuerySet(models.QuerySet):
+    def for_locations(self, locations):
+        return self.filter(
+            Q(location_from__in=locations) | Q(location_to__in=locations)
+        )
+
+
+class LocationDistance(models.Model):
+    location_from = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        related_name='distances_from',
+        verbose_name='Откуда'
+    )
+    location_to = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        related_name='distances_to',
+        verbose_name='Куда'
+    )
+    distance_km = models.FloatField(verbose_name='Расстояние, км')
+
+    objects = LocationDistanceQuerySet.as_manager()
+
+    class Meta:
+        unique_together = [
+            ['location_from', 'location_to']
+        ]
+
+    def __str__(self):
+        return f'{self.location_from} — {self.location_to}'
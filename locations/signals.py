@@ -0,0 +1,14 @@
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .models import Location, LocationDistance
+
+
+locations_geocoded = Signal()
+
+
+@receiver(post_save, sender=Location)
+def forget_location_distances(sender, instance, created, **kwargs):
+    if created:
+        return
+    LocationDistance.objects.for_locations([instance]).delete()
@@ -0,0 +1,133 @@
+from collections import defaultdict
+from math import ceil, cos, radians
+
+
+KM_PER_DEGREE = 111.32
+
+
+def get_km_per_degree(lat):
+    # Lengths of a degree of latitude and longitude on the WGS-84
+    # ellipsoid, accurate to a few meters per degree.
+    lat = radians(lat)
+    return (
+        111.132954 - 0.559822 * cos(2 * lat) + 0.001175 * cos(4 * lat),
+        111.412840 * cos(lat) - 0.0935 * cos(3 * lat),
+    )
+
+
+class GridIndex:
+    def __init__(self, points, cell_size_km=5):
+        self.cell_size = cell_size_km / KM_PER_DEGREE
+        self.points = {}
+        self.cells = defaultdict(list)
+        for point_id, (lat, lon) in points.items():
+            point = (float(lat), float(lon))
+            self.points[point_id] = point
+            self.cells[self.get_cell(point)].append(point_id)
+
+    def get_cell(self, point):
+        lat, lon = point
+        return int(lat // self.cell_size), int(lon // self.cell_size)
+
+    def get_candidate_ids(self, point, radius_km):
+        if radius_km is None:
+            return list(self.points)
+
+        lat = float(point[0])
+        row, column = self.get_cell((lat, float(point[1])))
+        lat_km, _ = get_km_per_degree(lat)
+        lat_delta = radius_km / lat_km * 1.01
+        # Degrees of longitude are shortest on the poleward edge.
+        _, lon_km = get_km_per_degree(min(abs(lat) + lat_delta, 89.9))
+        lon_delta = radius_km / max(lon_km, 0.01) * 1.01
+        rows = ceil(lat_delta / self.cell_size)
+        columns = ceil(lon_delta / self.cell_size)
+
+        if (2 * rows + 1) * (2 * columns + 1) > len(self.cells):
+            return [
+                point_id
+                for (cell_row, cell_column), point_ids in self.cells.items()
+                if abs(cell_row - row) <= rows
+                and abs(cell_column - column) <= columns
+                for point_id in point_ids
+            ]
+        return [
+            point_id
+            for cell_row in range(row - rows, row + rows + 1)
+            for cell_column in range(column - columns, column + columns + 1)
+            for point_id in self.cells.get((cell_row, cell_column), ())
+        ]
+
+
+class RadiusZone:
+    def __init__(self, center, radius_km):
+        self.lat, self.lon = float(center[0]), float(center[1])
+        self.radius_km = radius_km
+
+    def get_bounds(self):
+        lat_km, lon_km = get_km_per_degree(self.lat)
+        lat_delta = self.radius_km / lat_km * 1.01
+        lon_delta = self.radius_km / max(lon_km, 0.01) * 1.01
+        return (
+            self.lat - lat_delta,
+            self.lon - lon_delta,
+            self.lat + lat_delta,
+            self.lon + lon_delta,
+        )
+
+    def contains(self, point):
+        lat, lon = float(point[0]), float(point[1])
+        lat_km, lon_km = get_km_per_degree((lat + self.lat) / 2)
+        return (
+            ((lat - self.lat) * lat_km) ** 2 + ((lon - self.lon) * lon_km) ** 2
+            <= self.radius_km ** 2
+        )
+
+
+class PolygonZone:
+    def __init__(self, vertices):
+        self.vertices = [(float(lat), float(lon)) for lat, lon in vertices]
+
+    def get_bounds(self):
+        lats = [lat for lat, _ in self.vertices]
+        lons = [lon for _, lon in self.vertices]
+        return min(lats), min(lons), max(lats), max(lons)
+
+    def contains(self, point):
+        lat, lon = float(point[0]), float(point[1])
+        inside = False
+        previous_lat, previous_lon = self.vertices[-1]
+        for vertex_lat, vertex_lon in self.vertices:
+            if (vertex_lat > lat) != (previous_lat > lat):
+                crossing_lon = vertex_lon + (lat - vertex_lat) * (
+                    previous_lon - vertex_lon
+                ) / (previous_lat - vertex_lat)
+                if lon < crossing_lon:
+                    inside = not inside
+            previous_lat, previous_lon = vertex_lat, vertex_lon
+        return inside
+
+
+class ZoneIndex:
+    def __init__(self, cell_size_km=5):
+        self.cell_size = cell_size_km / KM_PER_DEGREE
+        self.cells = defaultdict(list)
+
+    def get_cell(self, point):
+        lat, lon = point
+        return int(float(lat) // self.cell_size), int(float(lon) // self.cell_size)
+
+    def add(self, zone_id, zone):
+        min_lat, min_lon, max_lat, max_lon = zone.get_bounds()
+        min_row, min_column = self.get_cell((min_lat, min_lon))
+        max_row, max_column = self.get_cell((max_lat, max_lon))
+        for row in range(min_row, max_row + 1):
+            for column in range(min_column, max_column + 1):
+                self.cells[(row, column)].append((zone_id, zone))
+
+    def find(self, point):
+        return {
+            zone_id
+            for zone_id, zone in self.cells.get(self.get_cell(point), ())
+            if zone.contains(point)
+        }
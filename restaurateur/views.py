@@ -2,15 +2,22 @@ from django import forms
 from django.shortcuts import redirect, render
 from django.views import View
 from django.urls import reverse_lazy
+from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
-from django.db.models import Case, Count, When
+from django.utils.dateparse import parse_datetime
 
 
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
+from django.db.models import Exists, OuterRef, Q
 
 
-from foodcartapp.models import Product, Restaurant, Order
+from foodcartapp.models import (
+    Order,
+    OrderCandidateRestaurant,
+    Product,
+    Restaurant,
+)
 
 
 class Login(forms.Form):
@@ -97,13 +104,74 @@ def view_restaurants(request):
     })
 
 
+ORDERS_PER_PAGE = 50
+
+
+def parse_orders_cursor(cursor):
+    try:
+        relevance, created_at, order_id = cursor.split('_')
+        return int(relevance), parse_datetime(created_at), int(order_id)
+    except ValueError:
+        return None
+
+
+def format_orders_cursor(order):
+    created_at = order.created_at.isoformat() if order.created_at else ''
+    return f'{order.relevance}_{created_at}_{order.id}'
+
+
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
-    orders = Order.objects.get_orders_summary().select_related(
+    orders = Order.objects.select_related(
         'cooking_restaurant'
-    ).exclude(status='done').annotate(
-        relevance=Count(Case(When(status='created', then=1)))
-    ).order_by('-relevance').with_available_restaurants()
+    ).exclude(status=Order.DONE).with_relevance()
+
+    statuses = [
+        (status, title) for status, title in Order.STATUS_CHOICES
+        if status != Order.DONE
+    ]
+    status = request.GET.get('status')
+    if status in dict(statuses):
+        orders = orders.filter(status=status)
+
+    restaurants = Restaurant.objects.order_by('name')
+    restaurant_id = request.GET.get('restaurant', '')
+    if restaurant_id.isdigit():
+        orders = orders.filter(
+            Q(cooking_restaurant_id=restaurant_id)
+            | Exists(OrderCandidateRestaurant.objects.filter(
+                order=OuterRef('pk'),
+                restaurant_id=restaurant_id
+            ))
+        )
+
+    cursor = parse_orders_cursor(request.GET.get('after', ''))
+    if cursor:
+        orders = orders.after(*cursor)
+
+    orders = orders[:ORDERS_PER_PAGE + 1].with_candidate_restaurants(
+        geocoding_timeout=settings.GEOCODER_TIME_BUDGET
+    )
+
+    next_page_query = None
+    if len(orders) > ORDERS_PER_PAGE:
+        orders = orders[:ORDERS_PER_PAGE]
+        query = request.GET.copy()
+        query['after'] = format_orders_cursor(orders[-1])
+        next_page_query = query.urlencode()
+
+    first_page_query = None
+    if cursor:
+        query = request.GET.copy()
+        query.pop('after')
+        first_page_query = query.urlencode()
+
     return render(request, template_name='order_items.html', context={
         'order_items': orders,
+        'statuses': statuses,
+        'selected_status': status,
+        'restaurants': restaurants,
+        'selected_restaurant': restaurant_id,
+        'next_page_query': next_page_query,
+        'first_page_query': first_page_query,
     })
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'debug_toolbar',
     'rest_framework',
+    'rest_framework.authtoken',
     'phonenumber_field',
 ]
 
@@ -96,6 +97,26 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
+CACHE_VERSION_TIMEOUT = env.int('CACHE_VERSION_TIMEOUT', 60)
+
+JSON_DUMPS = env.str('JSON_DUMPS', 'foodcartapp.renderers.dumps_with_orjson')
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodcartapp.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+ORDER_INTAKE_MODE = env.str('ORDER_INTAKE_MODE', 'sync')
+ORDERS_BATCH_MAX_SIZE = env.int('ORDERS_BATCH_MAX_SIZE', 1000)
+IDEMPOTENCY_KEY_TTL_HOURS = env.int('IDEMPOTENCY_KEY_TTL_HOURS', 24)
+
+PRODUCTS_API_MAX_AGE = env.int('PRODUCTS_API_MAX_AGE', 5)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -133,7 +154,28 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "bundles"),
 ]
 
-YANDEX_API_KEY = env.str('YANDEX_API_KEY')
+GEOCODER_BACKEND = env.str('GEOCODER_BACKEND', 'locations.geocoders.YandexGeocoder')
+if GEOCODER_BACKEND == 'locations.geocoders.YandexGeocoder':
+    YANDEX_API_KEY = env.str('YANDEX_API_KEY')
+else:
+    YANDEX_API_KEY = env.str('YANDEX_API_KEY', '')
+GEOCODER_FIXTURE_PATH = env.str('GEOCODER_FIXTURE_PATH', None)
+GAZETTEER_PATH = env.str('GAZETTEER_PATH', None)
+GAZETTEER_CITY = env.str('GAZETTEER_CITY', 'Москва')
+GEOCODER_MAX_WORKERS = env.int('GEOCODER_MAX_WORKERS', 8)
+GEOCODER_RATE_LIMIT = env.float('GEOCODER_RATE_LIMIT', 10)
+GEOCODER_CACHE_TTL_DAYS = env.int('GEOCODER_CACHE_TTL_DAYS', 90)
+GEOCODER_CONNECT_TIMEOUT = env.float('GEOCODER_CONNECT_TIMEOUT', 2)
+GEOCODER_TIMEOUT = env.float('GEOCODER_TIMEOUT', 5)
+GEOCODER_RETRIES = env.int('GEOCODER_RETRIES', 2)
+GEOCODER_TIME_BUDGET = env.float('GEOCODER_TIME_BUDGET', 1.5)
+
+DISTANCE_ENGINE = env.str('DISTANCE_ENGINE', 'numpy')
+DISTANCE_CACHE_SIZE = env.int('DISTANCE_CACHE_SIZE', 100000)
+DISTANCE_CACHE_DB = env.bool('DISTANCE_CACHE_DB', False)
+RESTAURANT_SEARCH_RADIUS_KM = env.float('RESTAURANT_SEARCH_RADIUS_KM', 30)
+RESTAURANT_SEARCH_LIMIT = env.int('RESTAURANT_SEARCH_LIMIT', None)
+RESTAURANT_GRID_CELL_KM = 5
 
 ROLLBAR_TOKEN = env.str('ROLLBAR_TOKEN', None)
 